@@ -0,0 +1,169 @@
+"""
+Ingestion benchmark for `load_and_stitch_from_folder`.
+
+Generates synthetic exports (see synthetic.py) for every combination of
+shape x duration x rate, then stitches each one in a fresh process and
+reports wall time, throughput and peak memory. Results can be saved as JSON
+and compared against a saved baseline to catch regressions.
+
+    python benchmarks/bench_ingest.py --durations 10min 1h --rates 20 100
+    python benchmarks/bench_ingest.py --save baseline.json
+    python benchmarks/bench_ingest.py --compare baseline.json
+
+The full matrix includes 24 h at 1000 Hz (tens of GB of CSV); use the
+filters or --quick on a laptop.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from synthetic import write_session
+
+SHAPES = ['single', 'batch']
+DURATIONS = {'10min': 600, '1h': 3600, '24h': 86400}
+RATES = [20, 100, 1000]
+
+DEFAULT_DATA_DIR = os.path.join(BENCH_DIR, "data")
+
+def _max_rss_bytes():
+    """Peak resident memory of this process so far."""
+    # On Linux ru_maxrss survives fork/exec, so a spawned child would report
+    # its parent's peak; VmHWM is reset by exec and is the child's own.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, other platforms KiB
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def _stitch_once(folder, queue):
+    """Runs in a fresh process so peak RSS belongs to this one stitch."""
+    import contextlib
+    import io
+    from stitcher import load_and_stitch_from_folder
+
+    baseline = _max_rss_bytes()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        df, status_msg = load_and_stitch_from_folder(folder)
+    seconds = time.perf_counter() - start
+    queue.put({
+        'seconds': seconds,
+        'rows': 0 if df is None else len(df),
+        'status': status_msg,
+        'peak_rss': _max_rss_bytes(),
+        'peak_rss_delta': _max_rss_bytes() - baseline,
+    })
+
+def ensure_session(data_dir, shape, duration_name, rate):
+    """Folder holding the synthetic export, generated on first use."""
+    folder = os.path.join(data_dir, f"{shape}_{duration_name}_{rate}hz")
+    marker = os.path.join(folder, ".complete")
+    if not os.path.exists(marker):
+        print(f"🔧 Generating {shape} export, {duration_name} at {rate} Hz...")
+        write_session(folder, shape, DURATIONS[duration_name], rate)
+        open(marker, 'w').close()
+    return folder
+
+def _folder_bytes(folder):
+    return sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder) if f.endswith('.csv'))
+
+def run_case(data_dir, shape, duration_name, rate, repeat=1):
+    folder = ensure_session(data_dir, shape, duration_name, rate)
+    size = _folder_bytes(folder)
+
+    ctx = mp.get_context('spawn')
+    runs = []
+    for _ in range(repeat):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_stitch_once, args=(folder, queue))
+        proc.start()
+        runs.append(queue.get())
+        proc.join()
+
+    best = min(runs, key=lambda r: r['seconds'])
+    return {
+        'case': f"{shape}/{duration_name}/{rate}hz",
+        'shape': shape,
+        'duration': duration_name,
+        'rate_hz': rate,
+        'input_bytes': size,
+        'rows': best['rows'],
+        'status': best['status'],
+        'seconds': best['seconds'],
+        'mb_per_s': size / 1e6 / best['seconds'],
+        'rows_per_s': best['rows'] / best['seconds'],
+        'peak_rss_mb': best['peak_rss'] / 1e6,
+        'peak_rss_delta_mb': best['peak_rss_delta'] / 1e6,
+    }
+
+def print_table(results):
+    print(f"{'case':<22}{'input MB':>10}{'rows':>12}{'seconds':>10}{'MB/s':>9}"
+          f"{'Mrows/s':>9}{'peak MB':>10}{'+MB':>9}")
+    for r in results:
+        print(f"{r['case']:<22}{r['input_bytes'] / 1e6:>10.1f}{r['rows']:>12}{r['seconds']:>10.3f}"
+              f"{r['mb_per_s']:>9.1f}{r['rows_per_s'] / 1e6:>9.2f}{r['peak_rss_mb']:>10.0f}"
+              f"{r['peak_rss_delta_mb']:>9.0f}")
+
+def compare(results, baseline, tolerance):
+    """Cases that got slower or hungrier than `baseline` by more than `tolerance`."""
+    before = {r['case']: r for r in baseline}
+    regressions = []
+    for r in results:
+        old = before.get(r['case'])
+        if old is None:
+            continue
+        if r['seconds'] > old['seconds'] * (1 + tolerance):
+            regressions.append(f"{r['case']}: {old['seconds']:.3f}s -> {r['seconds']:.3f}s")
+        if r['peak_rss_delta_mb'] > old['peak_rss_delta_mb'] * (1 + tolerance) + 5:
+            regressions.append(f"{r['case']}: peak +{old['peak_rss_delta_mb']:.0f} MB "
+                               f"-> +{r['peak_rss_delta_mb']:.0f} MB")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark load_and_stitch_from_folder on synthetic exports.")
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=SHAPES)
+    parser.add_argument("--durations", nargs="+", choices=list(DURATIONS), default=list(DURATIONS))
+    parser.add_argument("--rates", nargs="+", type=int, choices=RATES, default=RATES)
+    parser.add_argument("--quick", action="store_true", help="Only the 10 minute sessions")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the fastest is reported")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where generated exports are kept")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    durations = ['10min'] if args.quick else args.durations
+    results = []
+    for shape in args.shapes:
+        for duration_name in durations:
+            for rate in args.rates:
+                results.append(run_case(args.data_dir, shape, duration_name, rate, args.repeat))
+
+    print_table(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("❌ Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
@@ -0,0 +1,232 @@
+"""
+Synthetic RaceStudio exports for benchmarks and experiments.
+
+Simulates an LO206 kart lapping a ~750 m circuit and writes the session in
+either shape the stitcher accepts:
+
+- 'single': one CSV with the metadata block, "Beacon Markers", header and
+  units row, like a RaceStudio "export all channels" file.
+- 'batch': RPM.csv, _GPS.csv, Steering Angle.csv and GyroZ.csv.
+
+Files are written in blocks, so even 24 h at 1000 Hz never has to fit in memory.
+
+    python benchmarks/synthetic.py out/ --shape single --duration 3600 --rate 100
+"""
+import argparse
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+G = 9.81
+MPH_PER_MS = 2.237
+
+# Rows generated per block while writing
+BLOCK_ROWS = 500_000
+
+# GPS receivers log far slower than the engine/chassis channels
+GPS_MAX_HZ = 25
+
+# Where the fake track sits on the map
+ORIGIN_LAT = 40.0
+ORIGIN_LON = -75.0
+EARTH_RADIUS = 6_371_000.0
+
+# LO206 drivetrain: 15/58 gearing, ~0.87 m rear tyre circumference, clutch at ~1800
+GEAR_RATIO = 58 / 15
+TYRE_CIRCUMFERENCE = 0.87
+IDLE_RPM = 1800.0
+
+def build_track(points=4000):
+    """
+    Reference lap of the synthetic circuit, sampled on a fixed distance grid.
+
+    Returns a dict of arrays over distance 's' (m): x, y (m), curvature (1/m),
+    speed (m/s), long_acc (m/s^2) and 'lap_time' (elapsed time at each s).
+    """
+    theta = np.linspace(0, 2 * np.pi, points, endpoint=False)
+    x = 120 * np.cos(theta) + 25 * np.cos(3 * theta)
+    y = 70 * np.sin(theta) + 20 * np.sin(2 * theta)
+
+    # Arc length and curvature of the closed centre line
+    dx, dy = np.gradient(x), np.gradient(y)
+    ddx, ddy = np.gradient(dx), np.gradient(dy)
+    curvature = (dx * ddy - dy * ddx) / np.power(dx * dx + dy * dy, 1.5)
+    seg = np.hypot(np.diff(x, append=x[0]), np.diff(y, append=y[0]))
+    s = np.concatenate(([0.0], np.cumsum(seg)[:-1]))
+
+    # Grip-limited corner speeds, then acceleration / braking limits (two laps for closure)
+    speed = np.minimum(26.0, np.sqrt(1.3 * G / np.maximum(np.abs(curvature), 1e-6)))
+    for _ in range(2):
+        for i in range(points):
+            speed[i] = min(speed[i], np.sqrt(speed[i - 1] ** 2 + 2 * 2.5 * seg[i - 1]))
+        for i in range(points - 1, -1, -1):
+            nxt = (i + 1) % points
+            speed[i] = min(speed[i], np.sqrt(speed[nxt] ** 2 + 2 * 8.0 * seg[i]))
+
+    long_acc = np.gradient(speed) / np.maximum(seg, 1e-6) * speed
+    lap_time = np.concatenate(([0.0], np.cumsum(seg / speed)[:-1]))
+    return {
+        's': s, 'x': x, 'y': y, 'curvature': curvature, 'speed': speed,
+        'long_acc': long_acc, 'lap_time': lap_time,
+        'length': s[-1] + seg[-1], 'period': lap_time[-1] + seg[-1] / speed[-1],
+    }
+
+def lap_schedule(track, duration_s, seed=0):
+    """
+    Start time and pace factor of every lap that begins within the session.
+    The first lap is a slow out lap; the rest vary by about 1%.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration_s / track['period']) + 2
+    pace = 1 + rng.normal(0, 0.01, n)
+    pace[0] = 1.15
+    starts = np.concatenate(([0.0], np.cumsum(track['period'] * pace)[:-1]))
+    keep = starts < duration_s
+    return starts[keep], pace[keep]
+
+def simulate(track, starts, pace, times, rng):
+    """Every channel at the given session times, as a dict of arrays."""
+    lap = np.searchsorted(starts, times, side='right') - 1
+    # Lap-local time on the reference lap, then distance along the lap
+    tau = (times - starts[lap]) / pace[lap]
+    s = np.interp(tau, track['lap_time'], track['s'])
+
+    def at(name):
+        return np.interp(s, track['s'], track[name])
+
+    speed = at('speed') / pace[lap] + rng.normal(0, 0.05, len(times))
+    curvature = at('curvature')
+    x, y = at('x'), at('y')
+    lat_acc = speed ** 2 * curvature / G
+    yaw_rate = np.degrees(speed * curvature)
+    return {
+        'time': times,
+        'speed': speed,
+        'rpm': np.maximum(IDLE_RPM, speed / TYRE_CIRCUMFERENCE * 60 * GEAR_RATIO)
+               + rng.normal(0, 15, len(times)),
+        'steer': np.degrees(np.arctan(curvature * 1.04)) * 2.5 + rng.normal(0, 0.3, len(times)),
+        'lat_g': lat_acc + rng.normal(0, 0.02, len(times)),
+        'long_g': at('long_acc') / G + rng.normal(0, 0.02, len(times)),
+        'yaw_rate': -yaw_rate + rng.normal(0, 0.5, len(times)),
+        'lat': ORIGIN_LAT + np.degrees(y / EARTH_RADIUS),
+        'lon': ORIGIN_LON + np.degrees(x / (EARTH_RADIUS * np.cos(np.radians(ORIGIN_LAT)))),
+        'heading': np.degrees(np.arctan2(np.gradient(y), np.gradient(x))) % 360,
+    }
+
+def _blocks(duration_s, rate_hz, block_rows=BLOCK_ROWS):
+    n = int(round(duration_s * rate_hz))
+    for start in range(0, n, block_rows):
+        yield np.arange(start, min(start + block_rows, n)) / float(rate_hz)
+
+def write_single_file(path, duration_s, rate_hz, seed=0):
+    """Writes a single-file export; returns its beacon markers (lap end times)."""
+    track = build_track()
+    starts, pace = lap_schedule(track, duration_s, seed)
+    rng = np.random.default_rng(seed + 1)
+    markers = starts[1:]
+
+    header = ["Time", "GPS Speed", "RPM", "Steering Angle", "GPS LatAcc", "GPS LonAcc",
+              "GPS Latitude", "GPS Longitude", "GPS Heading", "Water Temp", "Exhaust Temp"]
+    units = ["s", "mph", "rpm", "deg", "g", "g", "deg", "deg", "deg", "C", "C"]
+
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        w.writerow(["Format", "AiM CSV File"])
+        w.writerow(["Venue", "Synthetic Raceway"])
+        w.writerow(["Vehicle", "LO206"])
+        w.writerow(["User", "benchmark"])
+        w.writerow(["Data Source", "AiM data logger"])
+        w.writerow(["Comment", f"synthetic seed={seed}"])
+        w.writerow(["Date", "Saturday, June 1, 2024"])
+        w.writerow(["Time", "10:00 AM"])
+        w.writerow(["Sample Rate", str(rate_hz)])
+        w.writerow(["Duration", f"{duration_s:.3f}"])
+        w.writerow(["Segment", "Session"])
+        w.writerow(["Beacon Markers"] + [f"{m:.3f}" for m in markers])
+        w.writerow(["Segment Times"] + [f"{e - s:.3f}" for s, e in zip(starts[:-1], markers)])
+        f.write("\n")
+        w.writerow(header)
+        w.writerow(units)
+        f.write("\n")
+
+        for times in _blocks(duration_s, rate_hz):
+            ch = simulate(track, starts, pace, times, rng)
+            block = pd.DataFrame({
+                "Time": ch['time'].round(3),
+                "GPS Speed": (ch['speed'] * MPH_PER_MS).round(2),
+                "RPM": ch['rpm'].round(0),
+                "Steering Angle": ch['steer'].round(1),
+                "GPS LatAcc": ch['lat_g'].round(3),
+                "GPS LonAcc": ch['long_g'].round(3),
+                "GPS Latitude": ch['lat'].round(7),
+                "GPS Longitude": ch['lon'].round(7),
+                "GPS Heading": ch['heading'].round(1),
+                "Water Temp": (55 + rng.normal(0, 0.2, len(times))).round(1),
+                "Exhaust Temp": (480 + rng.normal(0, 3, len(times))).round(0),
+            })
+            # Rounded to what the logger resolves; written with shortest float repr
+            block.to_csv(f, header=False, index=False, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    return markers
+
+def write_batch_files(folder, duration_s, rate_hz, seed=0):
+    """Writes RPM.csv, _GPS.csv, Steering Angle.csv and GyroZ.csv into `folder`."""
+    track = build_track()
+    starts, pace = lap_schedule(track, duration_s, seed)
+    rng = np.random.default_rng(seed + 1)
+    os.makedirs(folder, exist_ok=True)
+
+    # Channel files: header row, units row, then data (GPS has no units row)
+    channels = {
+        'RPM.csv': ('rpm', 'rpm'),
+        'Steering Angle.csv': ('steer', 'deg'),
+        'GyroZ.csv': ('yaw_rate', 'deg/s'),
+    }
+    handles = {name: open(os.path.join(folder, name), 'w') for name in channels}
+    gps = open(os.path.join(folder, '_GPS.csv'), 'w')
+    try:
+        for name, (_, unit) in channels.items():
+            handles[name].write(f'"Time","Value"\n"s","{unit}"\n')
+        gps.write('Time,GPS Speed,Lat,Lon\n')
+
+        gps_step = max(1, int(round(rate_hz / min(rate_hz, GPS_MAX_HZ))))
+        row = 0
+        for times in _blocks(duration_s, rate_hz):
+            ch = simulate(track, starts, pace, times, rng)
+            for name, (key, _) in channels.items():
+                pd.DataFrame({'t': ch['time'], 'v': ch[key]}).to_csv(
+                    handles[name], header=False, index=False, float_format='%.3f', lineterminator='\n')
+
+            # Keep every gps_step-th sample, counted across blocks
+            take = (np.arange(row, row + len(times)) % gps_step) == 0
+            pd.DataFrame({'t': ch['time'][take], 'speed': ch['speed'][take]}).assign(
+                lat=ch['lat'][take], lon=ch['lon'][take]).to_csv(
+                gps, header=False, index=False, float_format='%.7f', lineterminator='\n')
+            row += len(times)
+    finally:
+        for h in handles.values():
+            h.close()
+        gps.close()
+    return starts[1:]
+
+def write_session(folder, shape, duration_s, rate_hz, seed=0):
+    """Writes one synthetic session of the given shape into `folder`."""
+    os.makedirs(folder, exist_ok=True)
+    if shape == 'single':
+        return write_single_file(os.path.join(folder, 'session.csv'), duration_s, rate_hz, seed)
+    if shape == 'batch':
+        return write_batch_files(folder, duration_s, rate_hz, seed)
+    raise ValueError(f"Unknown export shape '{shape}'")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic RaceStudio export.")
+    parser.add_argument("folder", help="Output folder")
+    parser.add_argument("--shape", choices=['single', 'batch'], default='single')
+    parser.add_argument("--duration", type=float, default=600, help="Session length in seconds")
+    parser.add_argument("--rate", type=float, default=100, help="Sample rate in Hz")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    markers = write_session(args.folder, args.shape, args.duration, args.rate, args.seed)
+    print(f"✅ Wrote {args.shape} export to {args.folder} ({len(markers)} beacon markers)")
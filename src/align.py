@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# How a channel is sampled onto the target clock:
+#   nearest - closest sample (ties go to the earlier one, like merge_asof)
+#   linear  - straight line between the samples either side
+#   hold    - last sample at or before the target time (NaN before the first)
+INTERPOLATIONS = ('nearest', 'linear', 'hold')
+
+def target_clock(streams, target):
+    """
+    Time axis to align onto.
+
+    `target` is the name of a stream (use its own timestamps), 'fastest' (the
+    stream with the highest sample rate), or a number, giving a fixed-rate clock
+    in Hz spanning all streams.
+    """
+    target = _target_stream(streams, target)
+    if isinstance(target, str):
+        return streams[target]['time'].to_numpy()
+
+    t0 = min(s['time'].iloc[0] for s in streams.values() if len(s))
+    t1 = max(s['time'].iloc[-1] for s in streams.values() if len(s))
+    n = int(np.floor((t1 - t0) * target)) + 1
+    return t0 + np.arange(n) / float(target)
+
+def _target_stream(streams, target):
+    """The stream name a target resolves to ('fastest' picks one), else the rate as given."""
+    if target == 'fastest':
+        return max(streams, key=lambda name: _sample_rate(streams[name]['time'].to_numpy()))
+    return target
+
+def _sample_rate(times):
+    if len(times) < 2 or times[-1] <= times[0]:
+        return 0.0
+    return (len(times) - 1) / (times[-1] - times[0])
+
+def align_streams(streams, target='rpm', methods=None, default='nearest'):
+    """
+    Joins sorted channel streams onto one clock in a single pass.
+
+    `streams` maps a stream name to a DataFrame with a sorted 'time' column
+    plus the value columns to carry over. `methods` picks the interpolation
+    per value column (see INTERPOLATIONS); anything unlisted uses `default`.
+
+    Each stream is located against the target clock once (two binary searches
+    for the whole clock), and every column is gathered straight into the
+    output, so no intermediate merged frames are built.
+    """
+    methods = methods or {}
+    clock = target_clock(streams, target)
+    source = _target_stream(streams, target)
+    out = {'time': clock}
+
+    for name, stream in streams.items():
+        times = stream['time'].to_numpy()
+        value_cols = [c for c in stream.columns if c != 'time']
+        if name == source:
+            # The clock is this stream's own timestamps: every row is its own sample,
+            # duplicate timestamps included
+            for col in value_cols:
+                out[col] = stream[col].to_numpy()
+            continue
+        if len(times) == 0:
+            for col in value_cols:
+                out[col] = np.full(len(clock), np.nan)
+            continue
+
+        # Last sample at or before / first sample at or after each target time
+        before = np.searchsorted(times, clock, side='right') - 1
+        after = np.searchsorted(times, clock, side='left')
+        before_ok = before >= 0
+        before_c = np.clip(before, 0, len(times) - 1)
+        after_c = np.clip(after, 0, len(times) - 1)
+
+        nearest = None
+        for col in value_cols:
+            method = methods.get(col, default)
+            values = stream[col].to_numpy()
+
+            if method == 'linear':
+                out[col] = np.interp(clock, times, values.astype('float64'))
+            elif method == 'hold':
+                held = values[before_c].astype('float64')
+                held[~before_ok] = np.nan
+                out[col] = held
+            elif method == 'nearest':
+                if nearest is None:
+                    # The later sample only wins when strictly closer
+                    use_after = (after < len(times)) & (
+                        ~before_ok | (times[after_c] - clock < clock - times[before_c]))
+                    nearest = np.where(use_after, after_c, before_c)
+                out[col] = values[nearest]
+            else:
+                raise ValueError(f"Unknown interpolation '{method}' for {col}")
+
+    return pd.DataFrame(out, copy=False)
@@ -3,9 +3,47 @@ import pandas as pd
 import tempfile
 import os
 import shutil
-from langchain_experimental.agents import create_csv_agent
-from langchain_openai import ChatOpenAI
 from stitcher import load_and_stitch_from_folder
+from engineer import RaceEngineer, TelemetrySession, make_llm
+from fingerprint import content_fingerprint
+from cache import SessionCache, AnswerCache
+
+# Stitched sessions kept in memory across reruns; the least recently used is dropped
+MAX_CACHED_SESSIONS = 4
+
+@st.cache_resource(max_entries=MAX_CACHED_SESSIONS, show_spinner=False)
+def stitch_uploads(session_key, _uploads):
+    """Stitches one set of uploaded files, cached on `session_key` (their content hash)."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # This mimics the folder structure your stitcher expects
+        for name, data in _uploads:
+            with open(os.path.join(temp_dir, name), "wb") as f:
+                f.write(data)
+        return load_and_stitch_from_folder(temp_dir, cache=SessionCache())
+
+@st.cache_resource(show_spinner=False)
+def answer_cache():
+    """Answers already given, by session + setup + question (persists across restarts)."""
+    return AnswerCache()
+
+@st.cache_resource(show_spinner=False)
+def shared_llm():
+    """One LLM client for the whole app."""
+    return make_llm()
+
+@st.cache_resource(max_entries=MAX_CACHED_SESSIONS, show_spinner=False)
+def telemetry_session(session_key, _master_df):
+    """Derived tables of one stitched session, shared by every engineer on it."""
+    return TelemetrySession(_master_df)
+
+def session_engineer(session_key, master_df, setup_context):
+    """The RaceEngineer for this browser session, rebuilt when the data or setup changes."""
+    engineer_key = (session_key, setup_context)
+    if st.session_state.get("engineer_key") != engineer_key:
+        st.session_state.engineer = RaceEngineer(master_df, setup_context, llm=shared_llm(),
+                                                 session=telemetry_session(session_key, master_df))
+        st.session_state.engineer_key = engineer_key
+    return st.session_state.engineer
 
 # --- 1. CONFIGURATION ---
 st.set_page_config(
@@ -47,78 +85,46 @@ if "messages" not in st.session_state:
 
 # --- 4. MAIN LOGIC ---
 if uploaded_files:
-    # Create a temporary directory to process these files
-    # This mimics the folder structure your stitcher expects
-    with tempfile.TemporaryDirectory() as temp_dir:
-        
-        # Save uploaded files to the temp dir
-        for uploaded_file in uploaded_files:
-            file_path = os.path.join(temp_dir, uploaded_file.name)
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-        
-        # Run the Stitcher
-        with st.spinner("⚙️ Stitching telemetry files..."):
-            master_df, status_msg = load_and_stitch_from_folder(temp_dir)
-        
-        if master_df is not None:
-            st.success(f"✅ Data Processed! ({len(master_df)} samples)")
-            
-            # Save master dataframe to a temp CSV for the Agent to read
-            master_csv_path = os.path.join(temp_dir, "master_telemetry.csv")
-            master_df.to_csv(master_csv_path, index=False)
-            
-            # --- 5. CHAT INTERFACE ---
-            st.subheader("2. Ask the Engineer")
-
-            # Display Chat History
-            for message in st.session_state.messages:
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
-
-            # User Input
-            if prompt := st.chat_input("Ex: 'Where is my minimum RPM in Turn 4?'"):
-                # 1. Show User Message
-                st.session_state.messages.append({"role": "user", "content": prompt})
-                with st.chat_message("user"):
-                    st.markdown(prompt)
-
-                # 2. Generate AI Response
-                with st.chat_message("assistant"):
-                    with st.spinner("Thinking..."):
-                        try:
-                            # Initialize the Brain
-                            llm = ChatOpenAI(temperature=0, model="gpt-4o")
-                            
-                            agent = create_csv_agent(
-                                llm,
-                                master_csv_path,
-                                verbose=True,
-                                allow_dangerous_code=True,
-                                number_of_head_rows=5,
-                                # ADD THIS LINE BELOW:
-                                agent_executor_kwargs={"handle_parsing_errors": True}
-                            )
-
-                            # Combine Setup Context + User Question
-                            full_prompt = f"""
-                            You are an expert LO206 Karting Race Engineer.
-                            
-                            {setup_context}
-                            
-                            USER QUESTION: {prompt}
-                            
-                            When answering:
-                            1. Use the data in the dataframe.
-                            2. Look for 'lat_g' spikes to detect handling issues.
-                            3. Focus on 'rpm' drops to detect momentum loss.
-                            """
-                            
-                            response = agent.run(full_prompt)
-                            st.markdown(response)
-                            st.session_state.messages.append({"role": "assistant", "content": response})
-                        
-                        except Exception as e:
-                            st.error(f"AI Error: {e}")
-        else:
-            st.error(f"Could not stitch files: {status_msg}")
\ No newline at end of file
+    # Same files, same key: reruns reuse the stitched session instead of redoing it
+    uploads = [(f.name, f.getbuffer()) for f in uploaded_files]
+    session_key = content_fingerprint(uploads)
+
+    with st.spinner("⚙️ Stitching telemetry files..."):
+        master_df, status_msg = stitch_uploads(session_key, uploads)
+
+    if master_df is not None:
+        st.success(f"✅ Data Processed! ({len(master_df)} samples)")
+
+        # --- 5. CHAT INTERFACE ---
+        st.subheader("2. Ask the Engineer")
+
+        # Display Chat History
+        for message in st.session_state.messages:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
+        # User Input
+        if prompt := st.chat_input("Ex: 'Where is my minimum RPM in Turn 4?'"):
+            # 1. Show User Message
+            st.session_state.messages.append({"role": "user", "content": prompt})
+            with st.chat_message("user"):
+                st.markdown(prompt)
+
+            # 2. Generate AI Response
+            with st.chat_message("assistant"):
+                with st.spinner("Thinking..."):
+                    try:
+                        # Asked before about this session and setup? Answer straight away
+                        response = answer_cache().get(session_key, setup_context, prompt)
+                        if response is None:
+                            # The Brain is built once per session + setup, not per question
+                            engineer = session_engineer(session_key, master_df, setup_context)
+                            response = engineer.ask(prompt)
+                            answer_cache().put(session_key, setup_context, prompt, response)
+                        st.markdown(response)
+                        st.session_state.messages.append({"role": "assistant", "content": response})
+                    
+                    except Exception as e:
+                        st.error(f"AI Error: {e}")
+    else:
+        st.error(f"Could not stitch files: {status_msg}")
\ No newline at end of file
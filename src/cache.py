@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import glob
+import re
+import sqlite3
+import time
+from contextlib import closing
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from stitcher import PARSER_VERSION
+from fingerprint import folder_fingerprint
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "karting-ai-engineer", "sessions")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+
+DEFAULT_ANSWER_DB = os.path.join(os.path.expanduser("~"), ".cache", "karting-ai-engineer", "answers.sqlite")
+DEFAULT_MAX_ANSWERS = 5000
+DEFAULT_ANSWER_TTL = 7 * 24 * 3600  # a week
+
+class SessionCache:
+    """
+    On-disk Parquet cache of stitched master frames, keyed by content hash.
+
+    Entries record the parser version they were built with and are dropped
+    when it changes. The directory is kept under `max_bytes` by evicting the
+    least recently used entries (last use is tracked through the file mtime).
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or os.environ.get("KARTING_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for_folder(self, folder_path):
+        return folder_fingerprint(folder_path)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key):
+        """The cached master frame for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            table = pq.read_table(path)
+        except (OSError, pa.ArrowInvalid):
+            return None
+
+        meta = table.schema.metadata or {}
+        if meta.get(b'karting.parser_version') != str(PARSER_VERSION).encode():
+            # Built by an older stitcher, so it can't be trusted anymore
+            self._remove(path)
+            return None
+
+        df = table.to_pandas()
+        df.attrs = json.loads(meta.get(b'karting.attrs', b'{}'))
+        os.utime(path)  # mark as recently used
+        return df
+
+    def put(self, key, df):
+        """Stores a master frame and evicts old entries if over budget."""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        meta = dict(table.schema.metadata or {})
+        meta[b'karting.parser_version'] = str(PARSER_VERSION).encode()
+        meta[b'karting.attrs'] = json.dumps(df.attrs).encode()
+        table = table.replace_schema_metadata(meta)
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)  # readers never see a half-written entry
+        self._evict(keep=path)
+
+    def _evict(self, keep=None):
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*.parquet")):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def normalize_text(text):
+    """Case, whitespace and trailing punctuation folded away, so re-typed questions match."""
+    return re.sub(r"\s+", " ", (text or "").strip().lower()).rstrip(" ?!.")
+
+class AnswerCache:
+    """
+    Persistent cache of the engineer's answers, in one SQLite file.
+
+    Answers are keyed on the session fingerprint, the setup context and the
+    question (the last two normalized), plus the parser version the session
+    was stitched with. Entries expire `ttl` seconds after they were written,
+    and beyond `max_entries` the least recently used ones are dropped.
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ANSWERS, ttl=DEFAULT_ANSWER_TTL):
+        self.path = path or os.environ.get("KARTING_ANSWER_DB", DEFAULT_ANSWER_DB)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS answers ("
+                         "key TEXT PRIMARY KEY, answer TEXT NOT NULL, "
+                         "created REAL NOT NULL, last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+
+    def _connect(self):
+        # A connection per call: Streamlit serves reruns from several threads
+        return closing(sqlite3.connect(self.path, timeout=10, isolation_level=None))
+
+    @staticmethod
+    def key(session_key, setup_context, question):
+        # Each line of the setup normalized on its own, so re-indenting it doesn't matter
+        setup = "\n".join(filter(None, (normalize_text(line) for line in (setup_context or "").splitlines())))
+        h = hashlib.blake2b(digest_size=20)
+        for part in (str(PARSER_VERSION), session_key, setup, normalize_text(question)):
+            h.update(f"{part}\0".encode('utf-8'))
+        return h.hexdigest()
+
+    def get(self, session_key, setup_context, question):
+        """The cached answer, or None if there is none or it has expired."""
+        key = self.key(session_key, setup_context, question)
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT answer, created FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, session_key, setup_context, question, answer):
+        """Stores an answer, then drops expired and least recently used entries."""
+        key = self.key(session_key, setup_context, question)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO answers (key, answer, created, last_used) "
+                         "VALUES (?, ?, ?, ?)", (key, answer, now, now))
+            conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+            conn.execute("DELETE FROM answers WHERE key IN (SELECT key FROM answers "
+                         "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM answers")
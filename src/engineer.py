@@ -0,0 +1,310 @@
+import json
+from functools import cached_property
+
+import numpy as np
+
+from laps import lap_summary, fastest_lap, distance_grid, lap_deltas
+from track import build_corner_index
+
+MODEL = "gpt-4o"
+
+# Tool-call rounds per question before the model has to answer with what it has
+MAX_TOOL_ROUNDS = 4
+
+# Longest trace a tool hands back to the model
+MAX_TRACE_POINTS = 200
+
+def make_llm():
+    """The chat model behind the engineer. Stateless, so one client serves every session."""
+    # Imported here so the tool layer works (and can be exercised) without the OpenAI stack
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(temperature=0, model=MODEL)
+
+# --- Telemetry tools ---
+# Each tool takes the TelemetrySession plus its JSON arguments and returns
+# plain JSON-friendly data. Registration order is the order the model sees.
+TOOLS = {}
+
+def register_tool(name, description, properties=None, required=()):
+    """Registers a telemetry tool under `name` with a JSON schema for its arguments."""
+    def decorator(run):
+        TOOLS[name] = {
+            'name': name,
+            'description': description,
+            'parameters': {'type': 'object', 'properties': properties or {}, 'required': list(required)},
+            'run': run,
+        }
+        return run
+    return decorator
+
+def tool_schemas():
+    """The tools in OpenAI function-calling format, ready for `llm.bind_tools`."""
+    return [{'type': 'function', 'function': {k: t[k] for k in ('name', 'description', 'parameters')}}
+            for t in TOOLS.values()]
+
+class TelemetrySession:
+    """
+    A stitched session plus the derived tables the tools answer from. Each
+    one (lap summary, distance grid, corner index) is built on first use and
+    then kept, so repeated questions cost a lookup. It only depends on the
+    data, so one instance can serve every engineer built on the session.
+    """
+
+    def __init__(self, df):
+        self.df = df
+
+    @cached_property
+    def summary(self):
+        return lap_summary(self.df)
+
+    @cached_property
+    def grid(self):
+        # None without a speed channel, which every distance-based tool needs
+        return distance_grid(self.df)
+
+    @cached_property
+    def corners(self):
+        return build_corner_index(self.df, self.grid)
+
+    def laps(self, lap=None):
+        """Summary rows for one lap, or all of them."""
+        if lap is None:
+            return self.summary
+        return self.summary[self.summary['lap'] == lap]
+
+_LAP = {'type': 'integer', 'description': "Lap number; omit for every lap"}
+_CHANNEL = {'type': 'string', 'enum': ['rpm', 'speed_mph', 'lat_g', 'long_g', 'steer']}
+
+@register_tool('lap_times', "Lap time (s) of every lap, and whether the lap is complete "
+               "(out/in laps are not).")
+def _lap_times(session):
+    return session.summary[['lap', 'lap_time', 'complete']].to_dict('records')
+
+@register_tool('fastest_lap', "The fastest complete lap and its lap time.")
+def _fastest_lap(session):
+    row = fastest_lap(session.df)
+    if row is None:
+        return {'error': "No laps in this session"}
+    return {'lap': int(row['lap']), 'lap_time': float(row['lap_time'])}
+
+@register_tool('lap_stats', "Per-lap statistics: samples, lap time, rpm min/max/mean, speed min/max "
+               "(mph), peak lateral g and longitudinal g extremes.", {'lap': _LAP})
+def _lap_stats(session, lap=None):
+    return session.laps(lap).to_dict('records')
+
+@register_tool('peak_lat_g', "Peak lateral g of every lap (or one lap).", {'lap': _LAP})
+def _peak_lat_g(session, lap=None):
+    rows = session.laps(lap)
+    if 'lat_g_peak' not in rows.columns:
+        return {'error': "This session has no lateral g channel"}
+    return rows[['lap', 'lat_g_peak']].to_dict('records')
+
+@register_tool('list_corners', "The corners detected on this track, numbered from the start "
+               "line, with entry/apex/exit distance into the lap (m).")
+def _list_corners(session):
+    if session.grid is None:
+        return {'error': "This session has no speed channel"}
+    index = session.corners
+    first = index.drop_duplicates('corner')
+    return first[['corner', 'entry_m', 'apex_m', 'exit_m']].to_dict('records')
+
+@register_tool('corner_stat', "A statistic of one channel between entry and exit of one corner, "
+               "per lap. E.g. minimum rpm in turn 4: corner=4, channel='rpm', stat='min'.",
+               {'corner': {'type': 'integer'}, 'channel': _CHANNEL,
+                'stat': {'type': 'string', 'enum': ['min', 'max', 'mean']}, 'lap': _LAP},
+               required=('corner', 'channel', 'stat'))
+def _corner_stat(session, corner, channel, stat, lap=None):
+    if session.grid is None:
+        return {'error': "This session has no speed channel"}
+    index = session.corners
+    hits = index[(index['corner'] == corner) & (index['entry_row'] >= 0) & (index['exit_row'] >= 0)]
+    if lap is not None:
+        hits = hits[hits['lap'] == lap]
+    if hits.empty:
+        return {'error': f"Corner {corner} not found"}
+    if channel not in session.df.columns:
+        return {'error': f"This session has no '{channel}' channel"}
+
+    # Entry/exit bounds interleaved, so one reduceat covers every lap's corner
+    values = np.append(session.df[channel].to_numpy(dtype='float64'), np.nan)
+    bounds = np.column_stack((hits['entry_row'], hits['exit_row'] + 1)).ravel()
+    if stat == 'mean':
+        totals = np.add.reduceat(values, bounds)[::2]
+        result = totals / (hits['exit_row'].to_numpy() + 1 - hits['entry_row'].to_numpy())
+    else:
+        reduce = np.fmin if stat == 'min' else np.fmax
+        result = reduce.reduceat(values, bounds)[::2]
+    return [{'lap': int(l), stat: float(v)} for l, v in zip(hits['lap'], result)]
+
+@register_tool('speed_trace', "Speed (mph) against distance into the lap (m) for one lap, "
+               "optionally between two distances.",
+               {'lap': {'type': 'integer'}, 'start_m': {'type': 'number'}, 'end_m': {'type': 'number'},
+                'channel': _CHANNEL},
+               required=('lap',))
+def _speed_trace(session, lap, start_m=0.0, end_m=None, channel='speed_mph'):
+    grid = session.grid
+    if grid is None:
+        return {'error': "This session has no speed channel"}
+    row = np.flatnonzero(np.asarray(grid['lap']) == lap)
+    if len(row) == 0 or channel not in grid:
+        return {'error': f"No {channel} trace for lap {lap}"}
+    distance = np.asarray(grid['distance'])
+    end_m = distance[-1] if end_m is None else end_m
+    keep = np.flatnonzero((distance >= start_m) & (distance <= end_m))
+    keep = keep[::max(1, -(-len(keep) // MAX_TRACE_POINTS))]
+    values = np.asarray(grid[channel])[row[0], keep]
+    return {'distance_m': distance[keep].round(1).tolist(), channel: np.round(values, 3).tolist()}
+
+@register_tool('lap_delta', "Time gained (negative) or lost (positive) by a lap against a reference "
+               "lap (default: the fastest), in total and corner by corner.",
+               {'lap': {'type': 'integer'}, 'reference_lap': {'type': 'integer'}},
+               required=('lap',))
+def _lap_delta(session, lap, reference_lap=None):
+    if reference_lap is None:
+        fastest = fastest_lap(session.df)
+        if fastest is None:
+            return {'error': "No laps in this session"}
+        reference_lap = int(fastest['lap'])
+    grid = session.grid
+    if grid is None:
+        return {'error': "This session has no speed channel"}
+    laps = np.asarray(grid['lap'])
+    if lap not in laps or reference_lap not in laps:
+        return {'error': f"Lap {lap} or {reference_lap} not found"}
+
+    delta = lap_deltas(grid, reference_lap)[np.flatnonzero(laps == lap)[0]]
+    distance = np.asarray(grid['distance'])
+    valid = np.flatnonzero(~np.isnan(delta))
+    result = {'lap': lap, 'reference_lap': reference_lap,
+              'total_delta_s': float(delta[valid[-1]]) if len(valid) else None}
+
+    corners = session.corners.drop_duplicates('corner')
+    if len(corners) and len(valid):
+        at = lambda m: np.interp(m, distance[valid], delta[valid])
+        # A corner across the line (exit_m < entry_m) runs from entry to the end of
+        # the lap, then from the start (delta 0) to exit; this lap's opening stands in
+        gained = [at(x) - at(e) if x >= e else at(distance[valid[-1]]) - at(e) + at(x)
+                  for e, x in zip(corners['entry_m'], corners['exit_m'])]
+        result['by_corner'] = [{'corner': int(c), 'delta_s': float(d)}
+                               for c, d in zip(corners['corner'], gained)]
+    return result
+
+@register_tool('ask_pandas_agent', "Free-form analysis by a Python/pandas agent on the raw samples. "
+               "Slow: only for questions no other tool answers.",
+               {'question': {'type': 'string'}}, required=('question',))
+def _ask_pandas_agent(session, question, engineer=None):
+    if engineer is None:
+        return {'error': "No pandas agent available"}
+    return engineer.ask_agent(question)
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+class RaceEngineer:
+    """
+    The AI race engineer for one stitched session and one kart setup.
+
+    Questions are answered through the telemetry tools above: the model picks
+    a tool call or two and the numbers come from precomputed, vectorized
+    tables. Free-form analysis falls back to a pandas DataFrame agent working
+    on the stitched frame itself (in memory or memory-mapped), which is only
+    built the first time it is needed. Build a new engineer when the session
+    data or the setup context changes.
+
+    `llm` may be any chat model with LangChain's `bind_tools(schemas)` /
+    `invoke(messages)` interface whose replies carry `content` and
+    `tool_calls` ([{'name', 'args', 'id'}]), so a local stand-in can drive it.
+    Pass `session` (a TelemetrySession of the same data) to reuse derived
+    tables that are already built.
+    """
+
+    def __init__(self, master_df, setup_context, llm=None, session=None):
+        self.setup_context = setup_context
+        self.llm = llm or make_llm()
+        # Shallow copy: pandas 3 (pinned in requirements.txt) always copies on
+        # write, so whatever the agent's code does to its frame never reaches
+        # the cached session, and writes to a memory-mapped frame copy the
+        # touched column instead of failing
+        self.df = master_df.copy(deep=False)
+        self.session = session or TelemetrySession(master_df)
+        self.tool_llm = self.llm.bind_tools(tool_schemas())
+
+    @cached_property
+    def agent(self):
+        from langchain_experimental.agents import create_pandas_dataframe_agent
+        return create_pandas_dataframe_agent(
+            self.llm,
+            self.df,
+            verbose=True,
+            allow_dangerous_code=True,
+            number_of_head_rows=5,
+            agent_executor_kwargs={"handle_parsing_errors": True}
+        )
+
+    def prompt(self, question):
+        # Combine Setup Context + User Question
+        return f"""
+        You are an expert LO206 Karting Race Engineer.
+
+        {self.setup_context}
+
+        USER QUESTION: {question}
+
+        When answering:
+        1. Use the data in the dataframe.
+        2. Look for 'lat_g' spikes to detect handling issues.
+        3. Focus on 'rpm' drops to detect momentum loss.
+        """
+
+    def system_prompt(self):
+        return f"""
+        You are an expert LO206 Karting Race Engineer.
+
+        {self.setup_context}
+
+        Telemetry channels: {', '.join(map(str, self.df.columns))}.
+        Answer from the telemetry tools; they return exact numbers. Only use
+        ask_pandas_agent when no other tool fits the question.
+
+        When answering:
+        1. Look for 'lat_g' spikes to detect handling issues.
+        2. Focus on 'rpm' drops to detect momentum loss.
+        """
+
+    def run_tool(self, name, args):
+        """Runs one tool call; failures come back as {'error': ...} for the model to see."""
+        spec = TOOLS.get(name)
+        if spec is None:
+            return {'error': f"Unknown tool '{name}'"}
+        kwargs = dict(args or {})
+        if name == 'ask_pandas_agent':
+            kwargs['engineer'] = self
+        try:
+            return spec['run'](self.session, **kwargs)
+        except Exception as e:
+            return {'error': f"{name} failed: {e}"}
+
+    def ask(self, question):
+        messages = [
+            {'role': 'system', 'content': self.system_prompt()},
+            {'role': 'user', 'content': question},
+        ]
+        for _ in range(MAX_TOOL_ROUNDS):
+            reply = self.tool_llm.invoke(messages)
+            messages.append(reply)
+            if not reply.tool_calls:
+                return reply.content
+            for call in reply.tool_calls:
+                result = self.run_tool(call['name'], call.get('args'))
+                messages.append({'role': 'tool', 'tool_call_id': call['id'],
+                                 'content': json.dumps(result, default=_json_default)})
+        # Out of tool rounds: answer from what has been gathered so far
+        return self.llm.invoke(messages).content
+
+    def ask_agent(self, question):
+        """Free-form answer from the pandas agent (the pre-tools behaviour)."""
+        return self.agent.run(self.prompt(question))
@@ -0,0 +1,49 @@
+import hashlib
+import os
+import glob
+
+_READ_BLOCK = 1024 * 1024
+
+def file_digest(data):
+    """Content hash of one file, given its raw bytes or a path to read them from."""
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(data, (str, os.PathLike)):
+        with open(data, 'rb') as f:
+            for block in iter(lambda: f.read(_READ_BLOCK), b''):
+                h.update(block)
+    else:
+        h.update(data)
+    return h.hexdigest()
+
+def source_digests(sources):
+    """{file_name: digest} for an iterable of (file_name, bytes-or-path) pairs."""
+    return {name: file_digest(data) for name, data in sources}
+
+def combine_digests(digests):
+    """
+    Session key from per-file digests, independent of where the files live.
+
+    Keys of any subset of a session's files can be derived from the same
+    digests without reading the files again.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for name in sorted(digests):
+        h.update(f"{name}\0{digests[name]}\0".encode('utf-8'))
+    return h.hexdigest()
+
+def content_fingerprint(sources):
+    """
+    Hash of a set of export files, independent of where they live on disk.
+
+    `sources` is an iterable of (file_name, data) pairs where data is either
+    the raw bytes (e.g. a Streamlit upload) or a path to read them from.
+    """
+    return combine_digests(source_digests(sources))
+
+def folder_sources(folder_path):
+    """(file_name, path) of every CSV in an export folder."""
+    return [(os.path.basename(p), p) for p in glob.glob(os.path.join(folder_path, "*.csv"))]
+
+def folder_fingerprint(folder_path):
+    """Content hash of every CSV in an export folder."""
+    return content_fingerprint(folder_sources(folder_path))
@@ -0,0 +1,115 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from fingerprint import content_fingerprint
+from stitcher import sniff_file, process_single_file, process_batch_files, stream_single_file_to_store
+from store import SessionStore
+
+def find_sessions(root):
+    """
+    Groups every CSV under `root` into sessions.
+
+    Each single-file export is a session of its own; the batch channel files
+    (RPM.csv, _GPS.csv, ...) in one directory together make up one session.
+    Files of neither kind are ignored.
+    """
+    sessions = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        singles, channels = [], []
+        for name in sorted(filenames):
+            if not name.endswith('.csv'):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                fmt = sniff_file(path)
+            except OSError:
+                continue
+            if fmt == 'single_file':
+                singles.append(path)
+            elif fmt == 'batch_channel':
+                channels.append(path)
+
+        for path in singles:
+            sessions.append({'name': os.path.relpath(path, root), 'kind': 'single_file',
+                             'folder': dirpath, 'files': [path]})
+        if channels:
+            sessions.append({'name': os.path.relpath(dirpath, root), 'kind': 'batch',
+                             'folder': dirpath, 'files': channels})
+    return sessions
+
+def ingest_session(session, store_root, chunk_rows=None):
+    """
+    Stitches one session into the store (unless it is already there).
+
+    Returns a status record: name, key, ok, status, rows, seconds. Never
+    raises, so one bad session can't take down a whole batch.
+    """
+    start = time.perf_counter()
+    result = {'name': session['name'], 'key': None, 'ok': False, 'status': '', 'rows': 0}
+    try:
+        store = SessionStore(store_root)
+        key = content_fingerprint((os.path.basename(p), p) for p in session['files'])
+        result['key'] = key
+
+        df = store.open(key)
+        if df is not None:
+            status_msg = "Success (Cached)"
+        elif session['kind'] == 'single_file' and chunk_rows is not None:
+            df, status_msg = stream_single_file_to_store(session['files'][0], store, key, chunk_rows)
+        else:
+            if session['kind'] == 'single_file':
+                df, status_msg = process_single_file(session['files'][0])
+            else:
+                df, status_msg = process_batch_files(session['folder'])
+            if df is not None:
+                # Timings belong to this call, not to the stored session
+                df.attrs.pop('stages', None)
+                store.put(key, df)
+
+        result['ok'] = df is not None
+        result['status'] = status_msg
+        result['rows'] = len(df) if df is not None else 0
+    except Exception as e:
+        result['status'] = f"Error: {e}"
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def ingest_tree(root, store=None, workers=None, chunk_rows=None):
+    """
+    Finds every session under `root` and stitches them in parallel.
+
+    Sessions run on a process pool (`workers` processes, default one per
+    core) and land in `store` (a `SessionStore`). Returns one status record
+    per session, in the order the sessions were found.
+    """
+    store = store or SessionStore()
+    sessions = find_sessions(root)
+    print(f"🔧 Found {len(sessions)} sessions under {root}")
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(ingest_session, s, store.root, chunk_rows): s['name'] for s in sessions}
+        for future in as_completed(futures):
+            r = future.result()
+            results[futures[future]] = r
+            mark = "✅" if r['ok'] else "❌"
+            print(f"{mark} {r['name']}: {r['status']} ({r['rows']} samples, {r['seconds']:.2f}s)")
+
+    return [results[s['name']] for s in sessions]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stitch every session under a folder tree into the session store.")
+    parser.add_argument("root", help="Folder tree holding the RaceStudio exports")
+    parser.add_argument("--store", help="Session store directory (default: ~/.cache/karting-ai-engineer/store)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument("--chunk-rows", type=int, help="Stream single-file exports in blocks of this many rows")
+    args = parser.parse_args()
+
+    results = ingest_tree(args.root, SessionStore(args.store), args.workers, args.chunk_rows)
+    failed = [r for r in results if not r['ok']]
+    total = sum(r['seconds'] for r in results)
+    print(f"🏁 {len(results) - len(failed)}/{len(results)} sessions stitched ({total:.1f}s of work)")
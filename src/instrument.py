@@ -0,0 +1,59 @@
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger("stitcher")
+
+class StageRecorder:
+    """
+    Per-stage measurements of one stitch: wall time, rows, bytes read and
+    peak allocation.
+
+    Each stage becomes a plain dict in `stages` (JSON friendly, so it can ride
+    along in df.attrs['stages']) and is handed to `sink` as soon as it ends.
+    `peak_bytes` is only measured while tracemalloc is tracing (e.g. under
+    `python -X tracemalloc`), since tracing slows parsing down a lot.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, rows=None, bytes_read=None):
+        """Times the enclosed block; set 'rows' / 'bytes_read' on the yielded record."""
+        record = {'stage': name, 'seconds': 0.0, 'rows': rows,
+                  'bytes_read': bytes_read, 'peak_bytes': None}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if tracing:
+                record['peak_bytes'] = tracemalloc.get_traced_memory()[1] - base
+            self.stages.append(record)
+            if self.sink is not None:
+                self.sink(record)
+
+    def total_seconds(self):
+        return sum(s['seconds'] for s in self.stages)
+
+def log_sink(log=None, level=logging.INFO):
+    """A sink that writes each stage record to a `logging` logger."""
+    log = log or logger
+
+    def emit(record):
+        parts = [f"{record['stage']}: {record['seconds'] * 1000:.1f} ms"]
+        if record['rows'] is not None:
+            parts.append(f"{record['rows']} rows")
+        if record['bytes_read'] is not None:
+            parts.append(f"{record['bytes_read'] / 1e6:.1f} MB read")
+        if record['peak_bytes'] is not None:
+            parts.append(f"peak {record['peak_bytes'] / 1e6:.1f} MB")
+        log.log(level, ", ".join(parts))
+    return emit
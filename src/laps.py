@@ -0,0 +1,294 @@
+import numpy as np
+import pandas as pd
+
+MPH_TO_MS = 0.44704
+
+# Default spacing (m) of the distance grid laps are resampled onto
+DISTANCE_STEP = 1.0
+
+# Per-lap statistics kept in the summary: channel -> (column prefix, reductions)
+SUMMARY_CHANNELS = {
+    'rpm': ('rpm', ('min', 'max', 'mean')),
+    'speed_mph': ('speed', ('min', 'max')),
+    'lat_g': ('lat_g', ('peak',)),
+    'long_g': ('long_g', ('max', 'min')),
+}
+
+def time_column(df):
+    """Single-file exports call it 'Time', batch stitches 'time'."""
+    return 'Time' if 'Time' in df.columns else 'time'
+
+class LapSummaryBuilder:
+    """
+    Accumulates per-lap statistics block by block.
+
+    Every block is reduced with ufunc.reduceat over its lap boundaries (no
+    Python loop over laps or samples) and folded into running per-lap
+    min / max / sum / count arrays, so a session can be summarised in one pass
+    whether it arrives whole or in chunks. Rows must be grouped by lap, which
+    they are in any stitched frame.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.samples = np.zeros(0, dtype='int64')
+        self.t_first = np.zeros(0)
+        self.t_last = np.zeros(0)
+        self.stats = {}
+
+    def _grow(self, size):
+        if size <= self.size:
+            return
+        extra = size - self.size
+        self.samples = np.concatenate([self.samples, np.zeros(extra, dtype='int64')])
+        self.t_first = np.concatenate([self.t_first, np.full(extra, np.nan)])
+        self.t_last = np.concatenate([self.t_last, np.full(extra, np.nan)])
+        for name, arr in self.stats.items():
+            fill = 0 if name.endswith(('_sum', '_count')) else np.nan
+            self.stats[name] = np.concatenate([arr, np.full(extra, fill)])
+        self.size = size
+
+    def _stat(self, name):
+        if name not in self.stats:
+            fill = 0 if name.endswith(('_sum', '_count')) else np.nan
+            self.stats[name] = np.full(self.size, fill)
+        return self.stats[name]
+
+    def update(self, df):
+        laps = df['lap'].to_numpy()
+        if len(laps) == 0:
+            return
+        starts, counts, ids = _lap_runs(laps)
+        ends = starts + counts
+        self._grow(int(ids.max()) + 1)
+
+        np.add.at(self.samples, ids, ends - starts)
+        times = df[time_column(df)].to_numpy()
+        np.fmin.at(self.t_first, ids, times[starts])
+        np.fmax.at(self.t_last, ids, times[ends - 1])
+
+        for channel in SUMMARY_CHANNELS:
+            if channel not in df.columns:
+                continue
+            values = df[channel].to_numpy(dtype='float64')
+            np.fmin.at(self._stat(f'{channel}_min'), ids, np.fmin.reduceat(values, starts))
+            np.fmax.at(self._stat(f'{channel}_max'), ids, np.fmax.reduceat(values, starts))
+            valid = ~np.isnan(values)
+            np.add.at(self._stat(f'{channel}_sum'), ids, np.add.reduceat(np.where(valid, values, 0.0), starts))
+            np.add.at(self._stat(f'{channel}_count'), ids, np.add.reduceat(valid, starts))
+
+    def summary(self, beacon_markers=None):
+        """
+        One row per lap: samples, start/end time, lap_time, whether the lap is
+        complete, and the SUMMARY_CHANNELS statistics.
+
+        With beacon markers (which mark the END of a lap) the lap time is the
+        gap between markers, and only laps bounded by a marker on both sides
+        are complete; the out lap and the trailing in lap are not.
+        """
+        ids = np.flatnonzero(self.samples)
+        table = {
+            'lap': ids,
+            'samples': self.samples[ids],
+            'start_time': self.t_first[ids],
+            'end_time': self.t_last[ids],
+        }
+
+        markers = np.sort(np.asarray(beacon_markers if beacon_markers is not None else [], dtype='float64'))
+        complete = (ids >= 2) & (ids <= len(markers))
+        lap_time = table['end_time'] - table['start_time']
+        if complete.any():
+            k = ids[complete]
+            lap_time[complete] = markers[k - 1] - markers[k - 2]
+        table['lap_time'] = lap_time
+        table['complete'] = complete
+
+        for channel, (prefix, reductions) in SUMMARY_CHANNELS.items():
+            if f'{channel}_min' not in self.stats:
+                continue
+            lo = self.stats[f'{channel}_min'][ids]
+            hi = self.stats[f'{channel}_max'][ids]
+            for reduction in reductions:
+                if reduction == 'min':
+                    table[f'{prefix}_min'] = lo
+                elif reduction == 'max':
+                    table[f'{prefix}_max'] = hi
+                elif reduction == 'peak':
+                    table[f'{prefix}_peak'] = np.fmax(np.abs(lo), np.abs(hi))
+                elif reduction == 'mean':
+                    count = self.stats[f'{channel}_count'][ids]
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        table[f'{prefix}_mean'] = self.stats[f'{channel}_sum'][ids] / count
+        return pd.DataFrame(table)
+
+def summarize_laps(df):
+    """Per-lap summary table of a stitched frame (see `LapSummaryBuilder.summary`)."""
+    builder = LapSummaryBuilder()
+    builder.update(df)
+    return builder.summary(df.attrs.get('beacon_markers'))
+
+def lap_summary(df):
+    """
+    The session's lap summary as a DataFrame: the one cached at stitch time
+    in df.attrs['lap_summary'] if present, otherwise computed now.
+    """
+    records = df.attrs.get('lap_summary')
+    if records is not None:
+        return pd.DataFrame.from_records(records)
+    return summarize_laps(df)
+
+def fastest_lap(df):
+    """Row of the fastest complete lap (falls back to all laps), or None."""
+    summary = lap_summary(df)
+    if summary.empty:
+        return None
+    candidates = summary[summary['complete']] if summary['complete'].any() else summary
+    return candidates.loc[candidates['lap_time'].idxmin()]
+
+def _lap_runs(laps):
+    """(starts, counts, ids) of the consecutive runs of rows sharing a lap."""
+    starts = np.flatnonzero(np.diff(laps, prepend=laps[0] - 1))
+    counts = np.diff(np.append(starts, len(laps)))
+    return starts, counts, laps[starts].astype('int64')
+
+def lap_distance(df):
+    """
+    Distance (m) covered since the start of each row's lap, integrated from
+    speed_mph with the trapezoid rule. Restarts at 0 on every lap.
+    """
+    times = df[time_column(df)].to_numpy(dtype='float64')
+    speed = np.nan_to_num(df['speed_mph'].to_numpy(dtype='float64') * MPH_TO_MS).clip(min=0)
+    starts, counts, _ = _lap_runs(df['lap'].to_numpy())
+
+    step = np.zeros(len(times))
+    step[1:] = 0.5 * (speed[1:] + speed[:-1]) * np.diff(times)
+    step[starts] = 0  # no distance carried over a lap boundary
+    travelled = np.cumsum(step)
+    return travelled - np.repeat(travelled[starts], counts)
+
+def resample_by_distance(df, step=DISTANCE_STEP, channels=None):
+    """
+    Every lap resampled onto one fixed distance grid.
+
+    Returns a dict of arrays: 'lap' (lap ids), 'distance' (the grid, m),
+    'lap_length' (m per lap), 'elapsed' (s since the lap started) and one
+    entry per channel, each of shape (laps, len(distance)). Grid points past
+    the end of a shorter lap are NaN, so lap comparisons are plain NumPy
+    over axis 0, e.g. np.nanstd(grid['speed_mph'], axis=0). None if the
+    session is empty or has no speed channel to integrate distance from.
+
+    All laps are interpolated with a single np.interp call: each lap's
+    distance is shifted by its own offset so the whole session forms one
+    increasing axis.
+    """
+    if len(df) == 0 or 'speed_mph' not in df.columns:
+        return None
+    time_col = time_column(df)
+    if channels is None:
+        channels = [c for c in df.columns
+                    if c not in (time_col, 'lap') and pd.api.types.is_numeric_dtype(df[c])]
+
+    distance = lap_distance(df)
+    starts, counts, ids = _lap_runs(df['lap'].to_numpy())
+    lengths = distance[starts + counts - 1]
+    grid = np.arange(int(lengths.max() // step) + 1) * step
+
+    # Laps laid end to end, each one grid span (plus slack) further along
+    span = grid[-1] + 2 * step
+    offsets = np.arange(len(ids)) * span
+    xp = distance + np.repeat(offsets, counts)
+    x = grid[None, :] + offsets[:, None]
+    beyond = grid[None, :] > lengths[:, None]
+
+    times = df[time_col].to_numpy(dtype='float64')
+    series = {'elapsed': times - np.repeat(times[starts], counts)}
+    series.update((c, df[c].to_numpy(dtype='float64')) for c in channels)
+
+    out = {'lap': ids, 'distance': grid, 'lap_length': lengths}
+    for name, values in series.items():
+        resampled = np.interp(x, xp, values)
+        resampled[beyond] = np.nan
+        out[name] = resampled
+    return out
+
+def distance_grid(df, step=DISTANCE_STEP, store=None, key=None):
+    """
+    `resample_by_distance` for a stitched session, cached next to it in a
+    `SessionStore` when `store` and `key` are given.
+    """
+    name = f"distance_{step:g}m"
+    if store is not None and key is not None:
+        cached = store.get_arrays(key, name)
+        if cached is not None:
+            return cached
+    grid = resample_by_distance(df, step)
+    if grid is not None and store is not None and key is not None:
+        store.put_arrays(key, name, grid)
+    return grid
+
+def lap_deltas(grid, reference_lap):
+    """
+    Delta time (s) of every lap against `reference_lap` at each grid
+    distance: positive where the lap is behind the reference. Shape
+    (laps, len(distance)), NaN past the end of either lap.
+    """
+    row = np.flatnonzero(np.asarray(grid['lap']) == reference_lap)
+    if len(row) == 0:
+        raise ValueError(f"Lap {reference_lap} is not in the distance grid")
+    elapsed = np.asarray(grid['elapsed'])
+    return elapsed - elapsed[row[0]][None, :]
+
+def delta_time(df, reference_lap=None, step=DISTANCE_STEP, store=None, key=None):
+    """
+    Delta time of every lap against a reference (default: the session's
+    fastest complete lap), computed in one pass over the distance grid.
+
+    Returns a dict of 'lap', 'distance', 'delta' (laps x distance) and
+    'reference_lap', cached next to the session in a `SessionStore` when
+    `store` and `key` are given.
+    """
+    if reference_lap is None:
+        fastest = fastest_lap(df)
+        if fastest is None:
+            return None
+        reference_lap = int(fastest['lap'])
+
+    name = f"delta_{step:g}m_lap{reference_lap}"
+    if store is not None and key is not None:
+        cached = store.get_arrays(key, name)
+        if cached is not None:
+            return cached
+
+    grid = distance_grid(df, step, store, key)
+    if grid is None:
+        return None
+    deltas = {
+        'lap': np.asarray(grid['lap']),
+        'distance': np.asarray(grid['distance']),
+        'delta': lap_deltas(grid, reference_lap),
+        'reference_lap': np.array(reference_lap),
+    }
+    if store is not None and key is not None:
+        store.put_arrays(key, name, deltas)
+    return deltas
+
+def delta_channel(df, deltas):
+    """
+    The delta time as a per-sample channel of `df`, interpolated at each
+    row's distance into its lap (NaN for laps missing from `deltas`).
+    """
+    distance = np.asarray(deltas['distance'])
+    step = distance[1] - distance[0] if len(distance) > 1 else DISTANCE_STEP
+    span = distance[-1] + 2 * step
+    grid_laps = np.asarray(deltas['lap'])
+
+    # Same trick as resample_by_distance: all laps on one increasing axis
+    offsets = np.arange(len(grid_laps)) * span
+    xp = (distance[None, :] + offsets[:, None]).ravel()
+    values = np.asarray(deltas['delta']).ravel()
+
+    laps = df['lap'].to_numpy()
+    slot = np.searchsorted(grid_laps, laps)
+    known = (slot < len(grid_laps)) & (grid_laps[np.minimum(slot, len(grid_laps) - 1)] == laps)
+    x = lap_distance(df) + offsets[np.minimum(slot, len(grid_laps) - 1)]
+    return np.where(known, np.interp(x, xp, values), np.nan)
@@ -2,154 +2,599 @@ import pandas as pd
 import numpy as np
 import os
 import glob
+import csv
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from align import align_streams
+from instrument import StageRecorder
+from laps import LapSummaryBuilder, summarize_laps
+from track import detect_laps
+from fingerprint import file_digest, source_digests, combine_digests, folder_sources
 
-def load_and_stitch_from_folder(folder_path):
+# Bump whenever the stitched output changes, so cached sessions get rebuilt
+PARSER_VERSION = 7
+
+# Upper bound on channel files read at once in batch mode
+MAX_LOAD_WORKERS = 4
+
+# Columns compact_telemetry() leaves in float64
+COMPACT_KEEP_FLOAT64 = ('Time', 'time', 'lat', 'lon')
+
+# Rows per block in chunked (streaming) ingestion
+CHUNK_ROWS = 200_000
+
+# Bytes read from the top of each CSV to work out its format. Also bounds how
+# far a single-file export's metadata block may run before its header row.
+SNIFF_BYTES = 64 * 1024
+
+# Sniff results kept per file fingerprint (path, size, mtime)
+SNIFF_CACHE_SIZE = 4096
+
+# Batch-mode channel files, by role
+BATCH_FILES = {'rpm': 'RPM.csv', 'gps': '_GPS.csv', 'steer': 'Steering Angle.csv', 'gyro': 'GyroZ.csv'}
+
+# Column order of a batch-mode master: clock, channels, physics, lap
+BATCH_COLUMNS = ['time', 'rpm', 'speed', 'lat', 'lon', 'steer', 'yaw_rate', 'speed_mph', 'lat_g', 'lap']
+
+# Channels kept from a single-file export: RaceStudio name -> (AI name, dtype).
+# Time and GPS position stay float64 (float32 stops resolving 1 ms after ~2 hours
+# of session, and ~1 m in longitude); the other channels carry 3-5 significant
+# digits, well inside float32.
+SINGLE_FILE_SCHEMA = {
+    'Time': ('Time', 'float64'),
+    'RPM': ('rpm', 'float32'),
+    'GPS Speed': ('speed_mph', 'float32'),
+    'Steering Angle': ('steer', 'float32'),
+    'GPS LatAcc': ('lat_g', 'float32'),
+    'GPS LonAcc': ('long_g', 'float32'),
+    'GPS Latitude': ('lat', 'float64'),
+    'GPS Longitude': ('lon', 'float64'),
+}
+
+def load_and_stitch_from_folder(folder_path, cache=None, chunk_rows=None, compact=False, previous=None,
+                                sink=None):
+    """Stitches the export in `folder_path` into one master DataFrame, served from `cache` when possible."""
     print(f"🔧 Scanning files in: {folder_path}")
-    all_csvs = glob.glob(os.path.join(folder_path, "*.csv"))
-    
-    # STRATEGY 1: Check for a "Single File Export" (like 4.csv)
-    # This file type contains everything in one sheet but has metadata at the top.
-    for f in all_csvs:
-        try:
-            # Peek at the file to see if it has the tell-tale header
-            with open(f, 'r') as open_f:
-                lines = [open_f.readline() for _ in range(20)]
-            
-            # Look for the header line index
-            header_idx = -1
-            for i, line in enumerate(lines):
-                if '"Time"' in line and '"GPS Speed"' in line:
-                    header_idx = i
-                    break
-            
-            if header_idx != -1:
-                print(f"✅ Detected Single-File Export: {os.path.basename(f)}")
-                return process_single_file(f, header_idx)
-        except Exception as e:
+    recorder = StageRecorder(sink)
+    digests = None
+    if cache is not None:
+        sources = folder_sources(folder_path)
+        with recorder.stage('cache lookup', bytes_read=sum(os.path.getsize(p) for _, p in sources)):
+            digests = source_digests(sources)
+            key = combine_digests(digests)
+            cached = cache.get(key)
+        if cached is not None:
+            print("⚡ Loaded stitched session from cache")
+            return _finish(cached, compact, recorder), "Success (Cached)"
+        if previous is None:
+            previous = _find_previous(cache, digests)
+
+    if chunk_rows is not None and hasattr(cache, 'writer'):
+        single = [f for f, fmt in _sniff_folder(folder_path, recorder).items() if fmt == 'single_file']
+        if single:
+            print(f"✅ Streaming Single-File Export: {os.path.basename(single[0])}")
+            df, status_msg = stream_single_file_to_store(single[0], cache, key, chunk_rows, recorder)
+            return _finish(df, compact, recorder), status_msg
+
+    df, status_msg = _stitch_folder(folder_path, previous, recorder, digests)
+
+    if cache is not None and df is not None:
+        # Timings belong to this call, not to the cached session
+        df.attrs.pop('stages', None)
+        with recorder.stage('cache write', rows=len(df)):
+            cache.put(key, df)
+    return _finish(df, compact, recorder), status_msg
+
+def _find_previous(cache, digests):
+    """Cached batch master of this folder minus one channel file, or None."""
+    for name in sorted(digests):
+        if name not in BATCH_FILES.values():
+            continue
+        rest = {n: d for n, d in digests.items() if n != name}
+        previous = cache.get(combine_digests(rest))
+        if previous is not None and previous.attrs.get('sources'):
+            return previous
+    return None
+
+def _finish(df, compact, recorder):
+    if df is None:
+        return df
+    if compact:
+        df = compact_telemetry(df)
+    df.attrs['stages'] = recorder.stages
+    return df
+
+def _sniff_folder(folder_path, recorder=None):
+    """Format of every CSV in the folder; one bounded read per file at most."""
+    recorder = recorder or StageRecorder()
+    formats = {}
+    stats = {'bytes_read': 0}
+    with recorder.stage('sniff') as rec:
+        for f in sorted(glob.glob(os.path.join(folder_path, "*.csv"))):
+            try:
+                formats[f] = sniff_file(f, stats)
+            except OSError:
+                continue
+        rec['rows'] = len(formats)
+        rec['bytes_read'] = stats['bytes_read']
+    return formats
+
+def _stitch_folder(folder_path, previous=None, recorder=None, digests=None):
+    formats = _sniff_folder(folder_path, recorder)
+
+    # Formats are tried in registration order: a Single File Export (like 4.csv)
+    # carries everything in one sheet, so it wins over loose channel files.
+    for sniffer in SNIFFERS:
+        matches = [f for f, fmt in formats.items() if fmt == sniffer['name']]
+        if not matches:
             continue
+        if sniffer['scope'] == 'file':
+            print(f"✅ Detected {sniffer['label']}: {os.path.basename(matches[0])}")
+            return sniffer['parser'](matches[0], recorder=recorder)
+        if sniffer['name'] == 'batch_channel' and previous is not None and previous.attrs.get('sources'):
+            return restitch_incremental(folder_path, previous, recorder=recorder, digests=digests)
+        return sniffer['parser'](folder_path, recorder=recorder)
+
+    # Nothing recognised: the batch stitcher reports what is missing
+    return process_batch_files(folder_path, recorder=recorder)
+
+def _split_row(line):
+    """Split one CSV line, honouring RaceStudio's quoting."""
+    return next(csv.reader([line]), [])
+
+def read_export_preamble(handle, max_chars=SNIFF_BYTES):
+    """Reads the metadata, header and units rows of a single-file export; None if it isn't one."""
+    metadata = {}
+    consumed = 0
+    while consumed < max_chars:
+        line = handle.readline(max_chars - consumed)
+        if not line:
+            return None
+        consumed += len(line)
+
+        if '"Time"' in line and '"GPS Speed"' in line:
+            columns = [c.strip() for c in _split_row(line)]
+            # The "Units" row always follows the header
+            units = [u.strip() for u in _split_row(handle.readline())]
+            return {
+                'metadata': metadata,
+                'beacon_markers': _parse_beacon_markers(metadata.get('Beacon Markers', [])),
+                'columns': columns,
+                'units': units,
+            }
 
-    # STRATEGY 2: Fallback to "Batch Stitching" (RPM.csv + _GPS.csv, etc.)
-    return process_batch_files(folder_path)
+        row = _split_row(line)
+        if row and row[0].strip():
+            metadata[row[0].strip()] = [v.strip() for v in row[1:]]
 
-def process_single_file(file_path, header_idx):
+    return None
+
+def _parse_beacon_markers(values):
+    """Beacon marker times in seconds; anything that isn't a number is skipped."""
+    markers = []
+    for v in values:
+        try:
+            markers.append(float(v))
+        except ValueError:
+            pass
+    return markers
+
+def process_single_file(file_path, recorder=None):
     """Handles the all-in-one CSV format."""
+    recorder = recorder or StageRecorder()
     try:
-        # 1. Parse Metadata for Beacon Markers (Laps)
-        beacon_markers = []
         with open(file_path, 'r') as f:
-            for line in f:
-                if line.startswith('"Beacon Markers"'):
-                    parts = line.strip().split(',')
-                    # Extract numbers, removing quotes
-                    for p in parts[1:]:
-                        clean_p = p.replace('"', '')
-                        try:
-                            beacon_markers.append(float(clean_p))
-                        except:
-                            pass
-                    break
-        
-        # 2. Load Data (Using the detected header row)
-        # Note: We subtract 1 from the index because read_csv counts differently than readlines
-        df = pd.read_csv(file_path, header=header_idx-1, on_bad_lines='skip')
-        
-        # Drop the "Units" row (always the first row after header)
-        df = df.drop(0).reset_index(drop=True)
-        
-        # Clean Columns
-        df.columns = [c.strip().replace('"', '') for c in df.columns]
+            with recorder.stage('metadata parse') as rec:
+                preamble = read_export_preamble(f)
+                rec['bytes_read'] = f.tell()
+            if preamble is None:
+                return None, "Error processing single file: no header row found"
+            return parse_single_export(f, preamble, recorder)
+    except Exception as e:
+        return None, f"Error processing single file: {e}"
+
+def parse_single_export(handle, preamble, recorder=None):
+    """Parses the data rows of a single-file export, continuing after `read_export_preamble`."""
+    recorder = recorder or StageRecorder()
+    try:
+        # 1. Beacon Markers (Laps) were captured with the metadata block
+        beacon_markers = preamble['beacon_markers']
         
-        # Convert Types
-        numeric_cols = ['Time', 'RPM', 'GPS Speed', 'Steering Angle', 'GPS LatAcc', 'GPS LonAcc']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-
-        # 3. Assign Laps based on Beacon Markers
-        df['lap'] = 1 # Default to Lap 1
-        current_lap = 1
-        start_t = 0.0
+        # 2. Load Data (header and units row are already consumed)
+        # Only the schema channels are parsed, straight into their numeric dtypes
+        read_args = _schema_read_args(preamble)
+        if read_args is None:
+            return None, "Error processing single file: no Time column"
+        usecols, names, dtypes = read_args
+
+        data_start = handle.tell()
+        coerce = False
+        with recorder.stage('csv read', bytes_read=_bytes_left(handle, data_start)) as rec:
+            try:
+                df = pd.read_csv(handle, header=None, usecols=usecols, dtype=dtypes,
+                                 on_bad_lines='skip')
+            except ValueError:
+                # Stray text in a numeric channel: re-read untyped and coerce like before
+                handle.seek(data_start)
+                df = pd.read_csv(handle, header=None, usecols=usecols, on_bad_lines='skip')
+                coerce = True
+            rec['rows'] = len(df)
         
-        # Beacons mark the END of a lap
-        for marker in beacon_markers:
-            mask = (df['Time'] >= start_t) & (df['Time'] < marker)
-            df.loc[mask, 'lap'] = current_lap
-            start_t = marker
-            current_lap += 1
-            
-        # 4. Standardize Names for the AI
+        # 3. Standardize Names for the AI
         # The AI expects lowercase: 'rpm', 'speed_mph', 'lat_g', 'long_g'
-        rename_map = {
-            'RPM': 'rpm',
-            'GPS Speed': 'speed_mph',
-            'Steering Angle': 'steer',
-            'GPS LatAcc': 'lat_g',
-            'GPS LonAcc': 'long_g'
-        }
-        df = df.rename(columns=rename_map)
-        
-        # Select final columns
-        final_cols = ['Time', 'lap', 'rpm', 'speed_mph', 'steer', 'lat_g', 'long_g']
-        final_cols = [c for c in final_cols if c in df.columns]
+        with recorder.stage('type conversion', rows=len(df)):
+            if coerce:
+                _coerce_schema(df, dtypes)
+            df = df.rename(columns=names)
+
+        # 4. Assign Laps based on Beacon Markers
+        with recorder.stage('lap assignment', rows=len(df)):
+            laps, lap_offsets = assign_laps(df['Time'].to_numpy(), beacon_markers)
+            df['lap'] = laps
         
-        return df[final_cols], "Success (Single File)"
+        df = _select_final_cols(df)
+        df.attrs['metadata'] = preamble['metadata']
+        df.attrs['beacon_markers'] = beacon_markers
+        df.attrs['lap_offsets'] = lap_offsets
+        _attach_lap_summary(df, recorder)
+        df.attrs['stages'] = recorder.stages
+        return df, "Success (Single File)"
         
     except Exception as e:
         return None, f"Error processing single file: {e}"
 
-def process_batch_files(folder_path):
-    """Original logic for stitching RPM.csv + _GPS.csv"""
-    print("🔄 No single file found. Attempting batch stitch...")
-    files = {'rpm': 'RPM.csv', 'gps': '_GPS.csv', 'steer': 'Steering Angle.csv', 'gyro': 'GyroZ.csv'}
-    data_frames = {}
-    
-    # Load available files
-    for key, filename in files.items():
-        path = os.path.join(folder_path, filename)
-        if os.path.exists(path):
-            try:
-                # GPS usually has headers on row 0, others on row 1
-                skip = [1] if key != 'gps' else None
-                df = pd.read_csv(path, skiprows=skip)
-                df.columns = [c.strip().lower() for c in df.columns]
-                if 'time' in df.columns:
-                    df['time'] = pd.to_numeric(df['time'], errors='coerce')
-                    df = df.dropna(subset=['time']).sort_values('time')
-                    data_frames[key] = df
-            except: pass
+def _attach_lap_summary(df, recorder):
+    """Per-lap summary (see laps.py), kept in attrs as plain records so it caches with the session."""
+    with recorder.stage('lap summary', rows=len(df)):
+        df.attrs['lap_summary'] = summarize_laps(df).to_dict('records')
 
-    if 'rpm' not in data_frames:
-        return None, "RPM file missing."
+def _schema_read_args(preamble):
+    """(usecols, names, dtypes) for the schema channels, or None without a Time column."""
+    positions = {}
+    for i, col in enumerate(preamble['columns']):
+        if col in SINGLE_FILE_SCHEMA and col not in positions:
+            positions[col] = i
+    if 'Time' not in positions:
+        return None
+    usecols = sorted(positions.values())
+    names = {i: SINGLE_FILE_SCHEMA[col][0] for col, i in positions.items()}
+    dtypes = {i: SINGLE_FILE_SCHEMA[col][1] for col, i in positions.items()}
+    return usecols, names, dtypes
+
+def _coerce_schema(df, dtypes):
+    for i, dtype in dtypes.items():
+        df[i] = pd.to_numeric(df[i], errors='coerce').astype(dtype)
+
+def _bytes_left(handle, position):
+    """Bytes from `position` to the end of the file behind `handle`."""
+    try:
+        return max(os.fstat(handle.fileno()).st_size - position, 0)
+    except (OSError, AttributeError, TypeError):
+        return None
+
+def _select_final_cols(df):
+    final_cols = ['Time', 'lap', 'rpm', 'speed_mph', 'steer', 'lat_g', 'long_g', 'lat', 'lon']
+    return df[[c for c in final_cols if c in df.columns]]
 
-    # Merge
-    master = data_frames['rpm'].rename(columns={'value': 'rpm'})[['time', 'rpm']]
+def stream_single_file_to_store(file_path, store, key, chunk_rows=CHUNK_ROWS, recorder=None):
+    """Streams a single-file export into a `SessionStore` block by block."""
+    recorder = recorder or StageRecorder()
+    try:
+        with open(file_path, 'r') as f:
+            with recorder.stage('metadata parse') as rec:
+                preamble = read_export_preamble(f)
+                rec['bytes_read'] = f.tell()
+            if preamble is None:
+                return None, "Error processing single file: no header row found"
+            read_args = _schema_read_args(preamble)
+            if read_args is None:
+                return None, "Error processing single file: no Time column"
+
+            data_start = f.tell()
+            with recorder.stage('streamed ingest', bytes_read=_bytes_left(f, data_start)) as rec:
+                try:
+                    rec['rows'] = _stream_chunks(f, preamble, read_args, store.writer(key), chunk_rows)
+                except ValueError:
+                    # Stray text in a numeric channel: start over on the coercing path
+                    f.seek(data_start)
+                    rec['rows'] = _stream_chunks(f, preamble, read_args, store.writer(key), chunk_rows,
+                                                 coerce=True)
+    except Exception as e:
+        return None, f"Error processing single file: {e}"
+
+    df = store.open(key)
+    df.attrs['stages'] = recorder.stages
+    return df, "Success (Single File, Streamed)"
+
+def _stream_chunks(handle, preamble, read_args, writer, chunk_rows, coerce=False):
+    usecols, names, dtypes = read_args
+    markers = np.sort(np.asarray(preamble['beacon_markers'], dtype='float64'))
+    rows_per_lap = np.zeros(len(markers) + 1, dtype='int64')
+    summary = LapSummaryBuilder()
+    try:
+        reader = pd.read_csv(handle, header=None, usecols=usecols,
+                             dtype=None if coerce else dtypes,
+                             on_bad_lines='skip', chunksize=chunk_rows)
+        for chunk in reader:
+            if coerce:
+                _coerce_schema(chunk, dtypes)
+            chunk = chunk.rename(columns=names)
+
+            # Markers are session-wide, so laps carry across chunk boundaries as-is
+            lap_idx = np.searchsorted(markers, chunk['Time'].to_numpy(), side='right')
+            chunk['lap'] = lap_idx + 1
+            rows_per_lap += np.bincount(lap_idx, minlength=len(rows_per_lap))
+
+            chunk = _select_final_cols(chunk)
+            summary.update(chunk)
+            writer.append(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+
+    bounds = np.concatenate(([0], np.cumsum(rows_per_lap)))
+    lap_offsets = [[lap, int(bounds[lap - 1]), int(bounds[lap])]
+                   for lap in range(1, len(bounds))]
+    writer.close({
+        'metadata': preamble['metadata'],
+        'beacon_markers': preamble['beacon_markers'],
+        'lap_offsets': lap_offsets,
+        'lap_summary': summary.summary(markers).to_dict('records'),
+    })
+    return int(bounds[-1])
+
+def assign_laps(times, beacon_markers):
+    """Lap per sample plus the [lap, start_row, end_row] offset table. Beacons mark the END of a lap."""
+    markers = np.sort(np.asarray(beacon_markers, dtype='float64'))
+    bounds = np.concatenate(([0], np.searchsorted(times, markers, side='left'), [len(times)]))
+    lap_ids = np.arange(1, len(bounds))
+    laps = np.repeat(lap_ids, np.diff(bounds))
+    lap_offsets = [[int(lap), int(start), int(end)]
+                   for lap, start, end in zip(lap_ids, bounds[:-1], bounds[1:])]
+    return laps, lap_offsets
+
+def lap_slice(df, lap):
+    """Rows of one lap, using the lap offset table when the frame carries one."""
+    lap_offsets = df.attrs.get('lap_offsets')
+    if lap_offsets:
+        # Lap ids in the table are consecutive, so the entry is found by position
+        i = lap - lap_offsets[0][0]
+        if 0 <= i < len(lap_offsets):
+            _, start, end = lap_offsets[i]
+            return df.iloc[start:end]
+        return df.iloc[0:0]
+    return df[df['lap'] == lap]
+
+def _load_channel_file(key, path):
+    """Reads one batch-mode channel CSV, sorted by time. None if unusable."""
+    try:
+        # GPS usually has headers on row 0, others on row 1
+        skip = [1] if key != 'gps' else None
+        df = pd.read_csv(path, skiprows=skip)
+        df.columns = [c.strip().lower() for c in df.columns]
+        if 'time' not in df.columns:
+            return None
+        df['time'] = pd.to_numeric(df['time'], errors='coerce')
+        df = df.dropna(subset=['time'])
+        # Loggers write in time order, so the O(n) check almost always saves the sort
+        if not df['time'].is_monotonic_increasing:
+            df = df.sort_values('time')
+        return df
+    except Exception:
+        return None
+
+def _load_channel_files(folder_path, keys, digest_names=()):
+    """Loads (and hashes) batch channel files concurrently: ({key: df}, {file_name: digest})."""
+    paths = {key: os.path.join(folder_path, BATCH_FILES[key]) for key in keys}
+    paths = {key: path for key, path in paths.items() if os.path.exists(path)}
+    digest_paths = [(name, os.path.join(folder_path, name)) for name in digest_names]
+    digest_paths = [(name, path) for name, path in digest_paths if os.path.exists(path)]
+    if not paths and not digest_paths:
+        return {}, {}
+
+    workers = min(len(paths) + len(digest_paths), MAX_LOAD_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        loaded = pool.map(_load_channel_file, paths, paths.values())
+        digests = pool.map(file_digest, [path for _, path in digest_paths])
+        data_frames = {key: df for key, df in zip(paths, loaded) if df is not None}
+        sources = {name: d for (name, _), d in zip(digest_paths, digests)}
+    return data_frames, sources
+
+def _channel_streams(data_frames):
+    """Per-channel streams ready for `align_streams`, with standardized column names."""
+    streams = {}
+    if 'rpm' in data_frames:
+        streams['rpm'] = data_frames['rpm'].rename(columns={'value': 'rpm'})[['time', 'rpm']]
     if 'gps' in data_frames:
         # Find speed column
         cols = data_frames['gps'].columns
         speed_col = next((c for c in cols if 'speed' in c), 'speed')
-        gps_cols = ['time', speed_col, 'lat', 'lon']
         # Rename to 'speed' for consistency before merge
-        data_frames['gps'].rename(columns={speed_col: 'speed'}, inplace=True)
+        gps = data_frames['gps'].rename(columns={speed_col: 'speed'})
         # Only merge existing columns
-        gps_cols = [c for c in gps_cols if c in data_frames['gps'].columns]
-        master = pd.merge_asof(master, data_frames['gps'][gps_cols], on='time', direction='nearest')
+        gps_cols = [c for c in ['time', 'speed', 'lat', 'lon'] if c in gps.columns]
+        streams['gps'] = gps[gps_cols]
 
     if 'steer' in data_frames:
-        steer = data_frames['steer'].rename(columns={'value': 'steer'})[['time', 'steer']]
-        master = pd.merge_asof(master, steer, on='time', direction='nearest')
+        streams['steer'] = data_frames['steer'].rename(columns={'value': 'steer'})[['time', 'steer']]
         
     if 'gyro' in data_frames:
-        gyro = data_frames['gyro'].rename(columns={'value': 'yaw_rate'})[['time', 'yaw_rate']]
-        master = pd.merge_asof(master, gyro, on='time', direction='nearest')
+        streams['gyro'] = data_frames['gyro'].rename(columns={'value': 'yaw_rate'})[['time', 'yaw_rate']]
+    return streams
 
-    # Physics
-    master = master.fillna(0)
+def _batch_physics(master):
+    """Derived channels; recomputed whenever their inputs may have changed."""
     if 'speed' in master.columns:
         master['speed_mph'] = master['speed'] * 2.237
     if 'yaw_rate' in master.columns and 'speed' in master.columns:
         master['lat_g'] = (master['speed'] * np.radians(master['yaw_rate'])) / 9.81 * -1
+    return master
+
+def process_batch_files(folder_path, target='rpm', interpolation=None, recorder=None, start_finish=None):
+    """Original logic for stitching RPM.csv + _GPS.csv"""
+    print("🔄 No single file found. Attempting batch stitch...")
+    recorder = recorder or StageRecorder()
+    with recorder.stage('csv read', bytes_read=_files_size(folder_path, BATCH_FILES.values())) as rec:
+        data_frames, sources = _load_channel_files(folder_path, BATCH_FILES, BATCH_FILES.values())
+        rec['rows'] = sum(len(df) for df in data_frames.values())
+
+    if 'rpm' not in data_frames:
+        return None, "RPM file missing."
+
+    # Merge: every channel is aligned onto the target clock in one pass
+    streams = _channel_streams(data_frames)
+    with recorder.stage('merge') as rec:
+        master = align_streams(streams, target=target, methods=interpolation)
+        rec['rows'] = len(master)
+
+    # Physics
+    with recorder.stage('physics', rows=len(master)):
+        master = _batch_physics(master.fillna(0))
         
-    # Default Lap 0 if no summary file found (Batch mode needs summary file for laps)
-    master['lap'] = 0
-    
-    return master, "Success (Batch)"
\ No newline at end of file
+    # Laps from the start/finish gate on the raw GPS fixes; lap 0 if there is no GPS trace
+    with recorder.stage('lap assignment', rows=len(master)):
+        markers, gate = _gps_laps(streams.get('gps'), start_finish)
+        if markers:
+            master['lap'], lap_offsets = assign_laps(master['time'].to_numpy(), markers)
+            master.attrs['beacon_markers'] = markers
+            master.attrs['lap_offsets'] = lap_offsets
+        else:
+            master['lap'] = 0
+        if gate is not None:
+            master.attrs['start_finish'] = [list(end) for end in gate]
+    _attach_lap_summary(master, recorder)
+
+    # Only files that actually made it into the master count as its sources
+    used = {BATCH_FILES[key] for key in data_frames}
+    master.attrs['sources'] = {name: d for name, d in sources.items() if name in used}
+    master.attrs['alignment'] = {'target': target, 'interpolation': interpolation or {}}
+    master.attrs['stages'] = recorder.stages
+    return master, "Success (Batch)"
+
+def _gps_laps(gps, start_finish=None):
+    """(crossing times, gate) of the GPS stream, or ([], None) without lat/lon."""
+    if gps is None or 'lat' not in gps.columns or 'lon' not in gps.columns:
+        return [], None
+    gps = gps.dropna(subset=['lat', 'lon'])
+    speed = gps['speed'].to_numpy() if 'speed' in gps.columns else None
+    return detect_laps(gps['time'].to_numpy(), gps['lat'].to_numpy(), gps['lon'].to_numpy(),
+                       speed, start_finish)
+
+def _files_size(folder_path, names):
+    paths = [os.path.join(folder_path, name) for name in names]
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+def restitch_incremental(folder_path, previous, recorder=None, digests=None):
+    """Adds newly added channel files to a batch master; falls back to a full stitch."""
+    recorder = recorder or StageRecorder()
+    sources = previous.attrs.get('sources') or {}
+    alignment = previous.attrs.get('alignment') or {'target': 'rpm', 'interpolation': {}}
+    target = alignment['target']
+
+    current = [name for name in BATCH_FILES.values() if os.path.exists(os.path.join(folder_path, name))]
+    if digests is not None and all(name in digests for name in current):
+        digests = {name: digests[name] for name in current}
+    else:
+        with recorder.stage('fingerprint', bytes_read=_files_size(folder_path, current)):
+            digests = source_digests((name, os.path.join(folder_path, name)) for name in current)
+
+    new_keys = [key for key, name in BATCH_FILES.items() if name in digests and name not in sources]
+    changed = any(digests.get(name) != d for name, d in sources.items())
+    clock_fixed = isinstance(target, str) and target != 'fastest' and BATCH_FILES.get(target) in sources
+    if changed or not clock_fixed or 'gps' in new_keys:
+        # Keep the same start/finish gate so lap numbering doesn't shift
+        gate = previous.attrs.get('start_finish')
+        return process_batch_files(folder_path, target, alignment['interpolation'] or None, recorder,
+                                   start_finish=gate)
+
+    if not new_keys:
+        return previous, "Success (Batch, Unchanged)"
+
+    new_names = [BATCH_FILES[k] for k in new_keys]
+    print(f"➕ Adding {', '.join(new_names)} to the stitched session")
+    with recorder.stage('csv read', bytes_read=_files_size(folder_path, new_names)) as rec:
+        data_frames, _ = _load_channel_files(folder_path, new_keys)
+        rec['rows'] = sum(len(df) for df in data_frames.values())
+    streams = _channel_streams(data_frames)
+    if not streams:
+        return previous, "Success (Batch, Unchanged)"
+
+    # Align the new channels only, onto the time axis the master already has
+    with recorder.stage('merge', rows=len(previous)):
+        streams['_clock'] = previous[['time']]
+        added = align_streams(streams, target='_clock', methods=alignment['interpolation'])
+
+        master = previous.copy(deep=False)
+        for col in added.columns:
+            if col != 'time':
+                master[col] = added[col].fillna(0).to_numpy()
+    with recorder.stage('physics', rows=len(master)):
+        master = _batch_physics(master)
+    # Same layout as a full stitch of these files, since it is cached as one
+    rank = {c: i for i, c in enumerate(BATCH_COLUMNS)}
+    master = master[sorted(master.columns, key=lambda c: rank.get(c, len(rank)))]
+
+    master.attrs = dict(previous.attrs)
+    _attach_lap_summary(master, recorder)
+    master.attrs['stages'] = recorder.stages
+    master.attrs['sources'] = dict(sources, **{BATCH_FILES[k]: digests[BATCH_FILES[k]] for k in data_frames})
+    return master, "Success (Batch, Incremental)"
+
+def compact_telemetry(df):
+    """Compact copy of a stitched frame: float32 channels, float64 time and lat/lon, int16 lap."""
+    out = df.drop(columns=['speed']) if 'speed' in df.columns and 'speed_mph' in df.columns else df
+    dtypes = {}
+    for col in out.columns:
+        if col == 'lap':
+            dtypes[col] = 'int16'
+        elif col not in COMPACT_KEEP_FLOAT64 and out[col].dtype == 'float64':
+            dtypes[col] = 'float32'
+    out = out.astype(dtypes)
+    out.attrs = dict(df.attrs)
+    return out
+
+# --- Format sniffers ---
+# Each entry has a format name, a display label, sniff(file_name, head) -> bool,
+# the parser to dispatch to and its scope: 'file' parsers take the matching
+# path, 'folder' parsers take the whole export folder. Parsers also accept a
+# `recorder` keyword (a StageRecorder).
+SNIFFERS = []
+
+_sniff_cache = OrderedDict()
+
+def register_sniffer(name, label, parser, scope='file'):
+    """Decorator registering a format sniffer; earlier registrations take priority."""
+    def decorator(sniff):
+        SNIFFERS.append({'name': name, 'label': label, 'sniff': sniff,
+                         'parser': parser, 'scope': scope})
+        return sniff
+    return decorator
+
+def sniff_file(path, stats=None):
+    """Name of the registered format `path` matches, or None."""
+    st = os.stat(path)
+    fingerprint = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if fingerprint in _sniff_cache:
+        _sniff_cache.move_to_end(fingerprint)
+        return _sniff_cache[fingerprint]
+
+    with open(path, 'rb') as f:
+        raw = f.read(SNIFF_BYTES)
+    if stats is not None:
+        stats['bytes_read'] += len(raw)
+    head = raw.decode('utf-8', errors='replace')
+    file_name = os.path.basename(path)
+    fmt = next((s['name'] for s in SNIFFERS if s['sniff'](file_name, head)), None)
+
+    _sniff_cache[fingerprint] = fmt
+    if len(_sniff_cache) > SNIFF_CACHE_SIZE:
+        _sniff_cache.popitem(last=False)
+    return fmt
+
+@register_sniffer('single_file', "Single-File Export", process_single_file)
+def _sniff_single_file(file_name, head):
+    return any('"Time"' in line and '"GPS Speed"' in line for line in head.splitlines())
+
+@register_sniffer('batch_channel', "Batch Channel Files", process_batch_files, scope='folder')
+def _sniff_batch_channel(file_name, head):
+    return file_name in BATCH_FILES.values()
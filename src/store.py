@@ -0,0 +1,157 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from stitcher import PARSER_VERSION
+from fingerprint import folder_fingerprint
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "karting-ai-engineer", "store")
+
+MANIFEST = "manifest.json"
+
+class SessionStore:
+    """
+    Per-channel binary store for stitched sessions.
+
+    Each session is a directory holding one raw array per channel (`Time.bin`,
+    `rpm.bin`, ...) plus a small JSON manifest with dtypes, row count and the
+    frame's attrs. `open()` memory-maps the arrays read-only, so every process
+    reading the same session shares one copy through the OS page cache.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get("KARTING_STORE_DIR", DEFAULT_STORE_DIR)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _dir(self, key):
+        return os.path.join(self.root, key)
+
+    def key_for_folder(self, folder_path):
+        return folder_fingerprint(folder_path)
+
+    def has(self, key):
+        return os.path.exists(os.path.join(self._dir(key), MANIFEST))
+
+    def writer(self, key):
+        """A `SessionWriter` that appends row blocks to a new session."""
+        return SessionWriter(self._dir(key))
+
+    def put(self, key, df):
+        """Persists a whole stitched frame under `key`."""
+        w = self.writer(key)
+        w.append(df)
+        w.close(df.attrs)
+
+    def open(self, key):
+        """
+        The session as a DataFrame over read-only memory maps, or None if
+        missing or written by another parser version. No channel is copied.
+        """
+        session_dir = self._dir(key)
+        manifest = self.manifest(key)
+        if manifest is None:
+            return None
+        if manifest.get('parser_version') != PARSER_VERSION:
+            return None
+
+        columns = {}
+        for ch in manifest['channels']:
+            path = os.path.join(session_dir, ch['file'])
+            if manifest['rows'] == 0:
+                # np.memmap refuses empty files
+                columns[ch['name']] = np.empty(0, dtype=ch['dtype'])
+            else:
+                columns[ch['name']] = np.memmap(path, dtype=ch['dtype'], mode='r',
+                                                shape=(manifest['rows'],))
+
+        # copy=False keeps every column as its own block on top of the memmap
+        df = pd.DataFrame(columns, copy=False)
+        df.attrs = manifest.get('attrs', {})
+        return df
+
+    # Lets a SessionStore stand in for a SessionCache in load_and_stitch_from_folder
+    get = open
+
+    def manifest(self, key):
+        try:
+            with open(os.path.join(self._dir(key), MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_arrays(self, key, name, arrays):
+        """
+        Stores derived arrays (e.g. a distance grid) alongside session `key`
+        as `<name>/<field>.npy`. They go away with the session whenever it is
+        rewritten or deleted.
+        """
+        target = os.path.join(self._dir(key), name)
+        tmp_dir = f"{target}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for field, values in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{field}.npy"), np.asarray(values))
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp_dir, target)
+
+    def get_arrays(self, key, name):
+        """Arrays stored by `put_arrays`, memory-mapped read-only, or None."""
+        manifest = self.manifest(key)
+        if manifest is None or manifest.get('parser_version') != PARSER_VERSION:
+            return None
+        target = os.path.join(self._dir(key), name)
+        try:
+            files = sorted(f for f in os.listdir(target) if f.endswith('.npy'))
+        except OSError:
+            return None
+        return {f[:-4]: np.load(os.path.join(target, f), mmap_mode='r') for f in files}
+
+    def delete(self, key):
+        shutil.rmtree(self._dir(key), ignore_errors=True)
+
+class SessionWriter:
+    """
+    Builds one session directory block by block.
+
+    Data goes to a temporary directory that is only moved into place by
+    `close()`, so readers never see a partially written session.
+    """
+
+    def __init__(self, session_dir):
+        self.session_dir = session_dir
+        self.tmp_dir = f"{session_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+        self.channels = None
+        self.rows = 0
+
+    def append(self, df):
+        """Appends a block of rows; every block must have the same columns and dtypes."""
+        if self.channels is None:
+            self.channels = [{'name': str(c), 'dtype': df[c].dtype.str, 'file': f"{c}.bin"}
+                             for c in df.columns]
+        for ch in self.channels:
+            values = np.ascontiguousarray(df[ch['name']].to_numpy(), dtype=ch['dtype'])
+            with open(os.path.join(self.tmp_dir, ch['file']), 'ab') as f:
+                values.tofile(f)
+        self.rows += len(df)
+
+    def close(self, attrs=None):
+        """Writes the manifest and publishes the session."""
+        manifest = {
+            'parser_version': PARSER_VERSION,
+            'rows': self.rows,
+            'channels': self.channels or [],
+            'attrs': attrs or {},
+        }
+        with open(os.path.join(self.tmp_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+
+        shutil.rmtree(self.session_dir, ignore_errors=True)
+        os.replace(self.tmp_dir, self.session_dir)
+
+    def abort(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
@@ -0,0 +1,450 @@
+import numpy as np
+import pandas as pd
+
+from laps import DISTANCE_STEP, distance_grid, fastest_lap, lap_distance, lap_summary, _lap_runs
+
+EARTH_RADIUS = 6_371_000.0
+
+# Corner detection on the session's median cornering profile (distance grid)
+CORNER_THRESHOLD = 0.5     # fraction of the profile's 95th percentile
+CORNER_SMOOTH_M = 10.0     # moving-average window
+CORNER_MIN_LENGTH_M = 8.0  # shorter bumps are not corners
+CORNER_MERGE_GAP_M = 10.0  # corners closer than this are one corner
+
+# GPS start/finish line for lap detection
+GATE_HALF_WIDTH_M = 12.0   # the gate reaches this far either side of the racing line
+GATE_HEADING_SAMPLES = 5   # samples either side used for the heading at the gate
+MIN_LAP_S = 5.0            # crossings closer together than this are GPS jitter
+
+# Spatial index over a reference line
+INDEX_CELL_M = 3.0         # grid cell size
+INDEX_MAX_CELLS = 1 << 22  # cells are widened rather than exceed this
+QUERY_CHUNK = 250_000      # query points handled per block (bounds memory)
+
+def project(lat, lon, origin=None):
+    """
+    Equirectangular projection of GPS coordinates to metres (x east, y north)
+    around `origin` (lat, lon; default the first valid sample). Plenty for a
+    track a few hundred metres across.
+    """
+    lat = np.asarray(lat, dtype='float64')
+    lon = np.asarray(lon, dtype='float64')
+    if origin is None:
+        # flat indices, so a 2-D (laps x distance) input still gets one scalar origin
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        origin = (lat.flat[valid[0]], lon.flat[valid[0]]) if len(valid) else (0.0, 0.0)
+    lat0, lon0 = origin
+    x = EARTH_RADIUS * np.radians(lon - lon0) * np.cos(np.radians(lat0))
+    y = EARTH_RADIUS * np.radians(lat - lat0)
+    return x, y
+
+def unproject(x, y, origin):
+    """Inverse of `project` for the same `origin`."""
+    lat0, lon0 = origin
+    lat = lat0 + np.degrees(np.asarray(y, dtype='float64') / EARTH_RADIUS)
+    lon = lon0 + np.degrees(np.asarray(x, dtype='float64') / (EARTH_RADIUS * np.cos(np.radians(lat0))))
+    return lat, lon
+
+def default_gate(lat, lon, speed, half_width=GATE_HALF_WIDTH_M):
+    """
+    A start/finish gate across the track where the kart is fastest, which
+    is on the main straight at nearly every circuit: a segment of
+    2 * `half_width` metres perpendicular to the direction of travel there.
+    Returned as ((lat, lon), (lat, lon)), or None without usable GPS.
+    """
+    lat = np.asarray(lat, dtype='float64')
+    lon = np.asarray(lon, dtype='float64')
+    speed = np.asarray(speed, dtype='float64')
+    valid = ~(np.isnan(lat) | np.isnan(lon) | np.isnan(speed))
+    if valid.sum() < 2 * GATE_HEADING_SAMPLES + 1:
+        return None
+    lat, lon, speed = lat[valid], lon[valid], speed[valid]
+
+    i = int(np.argmax(speed))
+    origin = (lat[i], lon[i])
+    lo, hi = max(i - GATE_HEADING_SAMPLES, 0), min(i + GATE_HEADING_SAMPLES, len(lat) - 1)
+    x, y = project(lat[[lo, hi]], lon[[lo, hi]], origin)
+    heading = np.array([x[1] - x[0], y[1] - y[0]])
+    norm = np.hypot(*heading)
+    if norm == 0:
+        return None
+    nx, ny = -heading[1] / norm, heading[0] / norm
+    ends_lat, ends_lon = unproject([-nx * half_width, nx * half_width],
+                                   [-ny * half_width, ny * half_width], origin)
+    return ((float(ends_lat[0]), float(ends_lon[0])), (float(ends_lat[1]), float(ends_lon[1])))
+
+def gate_crossings(times, lat, lon, gate, min_lap_s=MIN_LAP_S):
+    """
+    Times at which the GPS trace crosses the `gate` segment ((lat, lon), (lat, lon)).
+
+    Every pair of consecutive fixes is intersected with the gate at once
+    (segment-segment intersection on projected coordinates) and the crossing
+    time is interpolated along the pair, so laps are timed to well under one
+    GPS sample. Only crossings in the session's usual direction count, and a
+    crossing within `min_lap_s` of the previous one is dropped.
+    """
+    times = np.asarray(times, dtype='float64')
+    if len(times) < 2:
+        return []
+    x, y = project(lat, lon, gate[0])
+    gx, gy = project([gate[1][0]], [gate[1][1]], gate[0])
+    ex, ey = gx[0], gy[0]
+
+    # Fix i to i+1 is p + u*d; the gate is v*e from its first end (at the origin)
+    dx, dy = np.diff(x), np.diff(y)
+    qx, qy = -x[:-1], -y[:-1]
+    denom = dx * ey - dy * ex
+    with np.errstate(invalid='ignore', divide='ignore'):
+        u = (qx * ey - qy * ex) / denom
+        v = (qx * dy - qy * dx) / denom
+    hit = (u >= 0) & (u < 1) & (v >= 0) & (v <= 1)
+    if not hit.any():
+        return []
+
+    # The side the kart crosses from tells the driving direction; keep the usual one
+    forward = denom > 0
+    hit &= forward if forward[hit].sum() * 2 >= hit.sum() else ~forward
+    idx = np.flatnonzero(hit)
+    crossings = times[idx] + u[idx] * np.diff(times)[idx]
+
+    kept = []
+    for t in crossings:
+        if not kept or t - kept[-1] >= min_lap_s:
+            kept.append(float(t))
+    return kept
+
+def detect_laps(times, lat, lon, speed=None, gate=None):
+    """
+    Start/finish crossings of a GPS trace, to be used like beacon markers.
+
+    Uses `gate` if given, otherwise `default_gate` (which needs `speed`).
+    Returns (crossing times, gate); no crossings gives ([], gate).
+    """
+    if gate is None:
+        if speed is None:
+            return [], None
+        gate = default_gate(lat, lon, speed)
+        if gate is None:
+            return [], None
+    return gate_crossings(times, lat, lon, gate), gate
+
+def _smooth(profile, window):
+    """Moving average that ignores NaN."""
+    if window <= 1:
+        return profile
+    kernel = np.ones(window)
+    valid = ~np.isnan(profile)
+    total = np.convolve(np.where(valid, profile, 0.0), kernel, mode='same')
+    count = np.convolve(valid.astype('float64'), kernel, mode='same')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return total / count
+
+def _gps_curvature(grid):
+    """|curvature| (1/m) of every lap on the distance grid, from lat/lon."""
+    lat, lon = np.asarray(grid['lat']), np.asarray(grid['lon'])
+    valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+    if len(valid) == 0:
+        return np.full(lat.shape, np.nan)
+    # Every lap in one frame of reference
+    x, y = project(lat, lon, (lat.flat[valid[0]], lon.flat[valid[0]]))
+    step = grid['distance'][1] - grid['distance'][0]
+    heading = np.arctan2(np.gradient(y, axis=1), np.gradient(x, axis=1))
+    heading = np.unwrap(np.nan_to_num(heading), axis=1)
+    return np.abs(np.gradient(heading, step, axis=1))
+
+def cornering_profile(grid, laps=None):
+    """
+    How hard the kart is cornering at each grid distance, typical over `laps`.
+
+    Every available signal (|lat_g|, |steer|, GPS curvature) is reduced to its
+    median over the laps, smoothed, and scaled by its own 95th percentile;
+    the profile is the mean of those, so ~1 means "as hard as the tightest
+    corners" whatever the units.
+    """
+    rows = np.ones(len(grid['lap']), dtype=bool) if laps is None else np.isin(grid['lap'], laps)
+    signals = []
+    if 'lat_g' in grid:
+        signals.append(np.abs(grid['lat_g']))
+    if 'steer' in grid:
+        signals.append(np.abs(grid['steer']))
+    if 'lat' in grid and 'lon' in grid and len(grid['distance']) > 2:
+        signals.append(_gps_curvature(grid))
+    if not signals:
+        return None
+
+    step = grid['distance'][1] - grid['distance'][0] if len(grid['distance']) > 1 else DISTANCE_STEP
+    window = max(int(round(CORNER_SMOOTH_M / step)), 1)
+    scaled = []
+    for signal in signals:
+        profile = _smooth(np.nanmedian(signal[rows], axis=0), window)
+        scale = np.nanpercentile(profile, 95)
+        if scale > 0:
+            scaled.append(profile / scale)
+    if not scaled:
+        return None
+    return np.nanmean(scaled, axis=0)
+
+def find_corners(profile, distance, threshold=CORNER_THRESHOLD, lap_length=None):
+    """
+    Corners as a DataFrame of corner, entry_m, apex_m, exit_m: runs of the
+    profile above `threshold`, with near neighbours merged and short runs
+    dropped. The apex is where the profile peaks.
+
+    With `lap_length`, a run at the end of the lap and one at its start that
+    meet across the start/finish line are one corner: it is numbered last and
+    has exit_m < entry_m (it exits on the next lap).
+    """
+    above = np.nan_to_num(profile) > threshold
+    edges = np.diff(above.astype('int8'), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+
+    if len(starts) > 1:
+        split = distance[starts[1:]] - distance[ends[:-1]] > CORNER_MERGE_GAP_M
+        starts = starts[np.concatenate(([True], split))]
+        ends = ends[np.concatenate((split, [True]))]
+
+    lengths = distance[ends] - distance[starts]
+    if lap_length is not None and len(starts) > 1:
+        across_line = distance[starts[0]] + (lap_length - distance[ends[-1]])
+        if across_line <= CORNER_MERGE_GAP_M:
+            starts, ends = starts[1:], np.append(ends[1:-1], ends[0])
+            lengths = np.append(lengths[1:-1], lap_length - distance[starts[-1]] + distance[ends[-1]])
+    long_enough = lengths >= CORNER_MIN_LENGTH_M
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    apex = []
+    for s, e in zip(starts, ends):
+        span = np.arange(s, e + 1) if e >= s else np.concatenate((np.arange(s, len(profile)), np.arange(e + 1)))
+        apex.append(span[np.nanargmax(profile[span])])
+    apex = np.array(apex, dtype='int64')
+    return pd.DataFrame({
+        'corner': np.arange(1, len(starts) + 1),
+        'entry_m': distance[starts],
+        'apex_m': distance[apex] if len(apex) else np.zeros(0),
+        'exit_m': distance[ends],
+    })
+
+def _distance_to_rows(df, corners, laps):
+    """
+    Row nearest each corner's entry/apex/exit distance on each of `laps`
+    (-1 past the end of the lap). Points of a corner that straddles the line
+    are looked up on the following lap, when the session has one.
+    """
+    distance = lap_distance(df)
+    starts, counts, ids = _lap_runs(df['lap'].to_numpy())
+    lengths = distance[starts + counts - 1]
+
+    # One sorted axis for the whole session, as in resample_by_distance
+    span = max(lengths.max(), corners['exit_m'].max(), corners['entry_m'].max()) + 1.0
+    offsets = np.arange(len(ids)) * span
+    axis = distance + np.repeat(offsets, counts)
+
+    pos = np.flatnonzero(np.isin(ids, laps))
+    entry_m = corners['entry_m'].to_numpy()
+    wrapped = corners['exit_m'].to_numpy() < entry_m
+    out = {'lap': np.repeat(ids[pos], len(corners)), 'corner': np.tile(corners['corner'].to_numpy(), len(pos))}
+    for point in ('entry', 'apex', 'exit'):
+        at = corners[f'{point}_m'].to_numpy()
+        shift = (wrapped & (at < entry_m)).astype('int64')
+        target = pos[:, None] + shift[None, :]
+        found = target < len(ids)
+        target = np.minimum(target, len(ids) - 1)
+        found &= ids[target] == ids[pos][:, None] + shift[None, :]
+        found &= lengths[target] >= at[None, :]
+        rows = np.searchsorted(axis, (at[None, :] + offsets[target]).ravel(), side='left')
+        out[f'{point}_m'] = np.tile(at, len(pos))
+        out[f'{point}_row'] = np.where(found.ravel(), np.minimum(rows, len(df) - 1), -1)
+    return pd.DataFrame(out)
+
+INDEX_COLUMNS = {
+    'lap': 'int64', 'corner': 'int64',
+    'entry_row': 'int64', 'apex_row': 'int64', 'exit_row': 'int64',
+    'entry_m': 'float64', 'apex_m': 'float64', 'exit_m': 'float64',
+}
+
+def _empty_index():
+    return pd.DataFrame({c: np.zeros(0, dtype=t) for c, t in INDEX_COLUMNS.items()})
+
+def build_corner_index(df, grid=None):
+    """
+    Corner segment index of a stitched session: one row per lap and corner
+    with corner, lap, entry/apex/exit rows (positions in `df`) and the
+    corner's entry/apex/exit distance into the lap. Corners are found once
+    on the median profile of the complete laps, so they are numbered the
+    same on every lap. Only complete laps are indexed (all laps if there are
+    none): an out or in lap starts or ends off the line, so its distance into
+    the lap doesn't match the track. Empty if the session has no cornering
+    or speed channel.
+    """
+    grid = grid if grid is not None else distance_grid(df)
+    if grid is None:
+        return _empty_index()
+
+    summary = lap_summary(df)
+    complete = summary.loc[summary['complete'], 'lap'].to_numpy()
+    laps = complete if len(complete) else np.asarray(grid['lap'])
+    profile = cornering_profile(grid, laps)
+    if profile is None:
+        return _empty_index()
+
+    lap_length = float(np.median(np.asarray(grid['lap_length'])[np.isin(grid['lap'], laps)]))
+    corners = find_corners(profile, np.asarray(grid['distance']), lap_length=lap_length)
+    if corners.empty:
+        return _empty_index()
+    return _distance_to_rows(df, corners, laps)[list(INDEX_COLUMNS)]
+
+def corner_index(df, store=None, key=None):
+    """`build_corner_index`, cached next to the session in a `SessionStore` when given one."""
+    if store is not None and key is not None:
+        cached = store.get_arrays(key, 'corners')
+        if cached is not None:
+            return pd.DataFrame({c: np.asarray(cached[c]) for c in INDEX_COLUMNS if c in cached})
+    index = build_corner_index(df, distance_grid(df, store=store, key=key))
+    if store is not None and key is not None:
+        store.put_arrays(key, 'corners', {c: index[c].to_numpy() for c in index.columns})
+    return index
+
+def corner_slice(df, index, corner, lap):
+    """Rows of `df` from entry to exit of `corner` on `lap` (empty if the lap never got there)."""
+    hit = index[(index['corner'] == corner) & (index['lap'] == lap)]
+    if hit.empty or hit['exit_row'].iloc[0] < 0 or hit['entry_row'].iloc[0] < 0:
+        return df.iloc[0:0]
+    return df.iloc[int(hit['entry_row'].iloc[0]):int(hit['exit_row'].iloc[0]) + 1]
+
+class TrackIndex:
+    """
+    Uniform grid over the projected points of a reference line, for batched
+    nearest-point queries.
+
+    Points are bucketed by cell and stored cell by cell (CSR layout: `order`
+    lists point ids grouped by cell, `starts` where each cell's run begins).
+    A query only looks at the 3x3 cells around it, expanded for all query
+    points at once; anything whose nearest candidate is further than one cell
+    away (off the map, or in a sparse stretch) falls back to brute force.
+    """
+
+    def __init__(self, x, y, cell=INDEX_CELL_M):
+        x = np.asarray(x, dtype='float64')
+        y = np.asarray(y, dtype='float64')
+        self.ids = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+        self.x, self.y = x[self.ids], y[self.ids]
+        if len(self.ids) == 0:
+            raise ValueError("TrackIndex needs at least one point")
+
+        self.x0, self.y0 = self.x.min(), self.y.min()
+        width, height = self.x.max() - self.x0, self.y.max() - self.y0
+        self.cell = max(cell, np.sqrt((width + cell) * (height + cell) / INDEX_MAX_CELLS))
+        self.nx = int(width // self.cell) + 1
+        self.ny = int(height // self.cell) + 1
+
+        cell_ids = self._cells(self.x, self.y)
+        self.order = np.argsort(cell_ids, kind='stable')
+        self.starts = np.searchsorted(cell_ids[self.order], np.arange(self.nx * self.ny + 1))
+
+    def _cells(self, x, y):
+        return ((y - self.y0) // self.cell).astype('int64') * self.nx + ((x - self.x0) // self.cell).astype('int64')
+
+    def query(self, x, y):
+        """(index of the nearest point, distance to it) for every query point; -1 / NaN for NaN queries."""
+        x = np.asarray(x, dtype='float64')
+        y = np.asarray(y, dtype='float64')
+        nearest = np.full(len(x), -1, dtype='int64')
+        dist = np.full(len(x), np.nan)
+        for start in range(0, len(x), QUERY_CHUNK):
+            block = slice(start, start + QUERY_CHUNK)
+            nearest[block], dist[block] = self._query_block(x[block], y[block])
+        return nearest, dist
+
+    def _query_block(self, x, y):
+        n = len(x)
+        valid = ~(np.isnan(x) | np.isnan(y))
+        cx = np.where(valid, (x - self.x0) // self.cell, -2).astype('int64')
+        cy = np.where(valid, (y - self.y0) // self.cell, -2).astype('int64')
+
+        best = np.full(n, -1, dtype='int64')
+        best_d2 = np.full(n, np.inf)
+
+        # One neighbour cell at a time: every query's candidates in that cell form one
+        # contiguous run, reduced with minimum.reduceat and folded into the running best
+        for ox in (-1, 0, 1):
+            for oy in (-1, 0, 1):
+                nx, ny = cx + ox, cy + oy
+                inside = valid & (nx >= 0) & (nx < self.nx) & (ny >= 0) & (ny < self.ny)
+                q = np.flatnonzero(inside)
+                cells = ny[q] * self.nx + nx[q]
+                first, counts = self.starts[cells], self.starts[cells + 1] - self.starts[cells]
+                occupied = counts > 0
+                q, first, counts = q[occupied], first[occupied], counts[occupied]
+                if len(q) == 0:
+                    continue
+                run_start = np.cumsum(counts) - counts
+                points = self.order[np.repeat(first - run_start, counts) + np.arange(counts.sum())]
+                queries = np.repeat(q, counts)
+                d2 = (self.x[points] - x[queries]) ** 2 + (self.y[points] - y[queries]) ** 2
+
+                run_min = np.minimum.reduceat(d2, run_start)
+                hits = np.flatnonzero(d2 == np.repeat(run_min, counts))
+                hits = hits[np.flatnonzero(np.diff(queries[hits], prepend=-1))]
+                closer = run_min < best_d2[q]
+                best[q[closer]] = points[hits[closer]]
+                best_d2[q[closer]] = run_min[closer]
+
+        # Only a hit within one cell is guaranteed to be the true nearest point
+        unsure = np.flatnonzero(valid & (best_d2 > self.cell ** 2))
+        if len(unsure):
+            best[unsure], best_d2[unsure] = self._brute_force(x[unsure], y[unsure])
+
+        dist = np.where(valid, np.sqrt(best_d2), np.nan)
+        return np.where(valid, self.ids[np.maximum(best, 0)], -1), dist
+
+    def _brute_force(self, x, y):
+        rows = max(1, QUERY_CHUNK // max(len(self.x), 1))
+        best = np.empty(len(x), dtype='int64')
+        best_d2 = np.empty(len(x))
+        for start in range(0, len(x), rows):
+            qx, qy = x[start:start + rows, None], y[start:start + rows, None]
+            d2 = (self.x[None, :] - qx) ** 2 + (self.y[None, :] - qy) ** 2
+            best[start:start + rows] = d2.argmin(axis=1)
+            best_d2[start:start + rows] = d2.min(axis=1)
+        return best, best_d2
+
+def reference_line(df, grid=None, lap=None):
+    """
+    The racing line of one lap (default: the fastest complete one) on the
+    distance grid, projected to metres: dict of 'lap', 'distance', 'x', 'y'
+    and the projection 'origin'. None if the session has no GPS position or speed.
+    """
+    if 'lat' not in df.columns or 'lon' not in df.columns:
+        return None
+    grid = grid if grid is not None else distance_grid(df)
+    if grid is None:
+        return None
+    if lap is None:
+        fastest = fastest_lap(df)
+        lap = int(fastest['lap']) if fastest is not None else int(grid['lap'][0])
+    row = np.flatnonzero(np.asarray(grid['lap']) == lap)
+    if len(row) == 0:
+        return None
+    lat, lon = np.asarray(grid['lat'][row[0]]), np.asarray(grid['lon'][row[0]])
+    keep = ~(np.isnan(lat) | np.isnan(lon))
+    if not keep.any():
+        return None
+    origin = (float(lat[keep][0]), float(lon[keep][0]))
+    x, y = project(lat[keep], lon[keep], origin)
+    return {'lap': lap, 'distance': np.asarray(grid['distance'])[keep], 'x': x, 'y': y, 'origin': origin}
+
+def track_position(df, reference=None, index=None):
+    """
+    Every sample mapped onto the reference line: (distance along it in m,
+    distance off it in m). Builds the reference and its `TrackIndex` unless
+    they are passed in, so both can be reused across sessions at one track.
+    """
+    reference = reference if reference is not None else reference_line(df)
+    if reference is None:
+        return None, None
+    index = index if index is not None else TrackIndex(reference['x'], reference['y'])
+    x, y = project(df['lat'].to_numpy(), df['lon'].to_numpy(), reference['origin'])
+    nearest, offset = index.query(x, y)
+    along = np.where(nearest >= 0, reference['distance'][np.maximum(nearest, 0)], np.nan)
+    return along, offset
@@ -0,0 +1,51 @@
+"""
+align_streams against the chained merge_asof(direction='nearest') it
+replaced, on streams with repeated and equidistant (tied) timestamps.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from align import align_streams
+
+def _stream(rng, name, n, step):
+    # Timestamps on a coarse grid, so repeats and exact midpoints both occur
+    times = np.sort(rng.integers(0, 200, n)) * step
+    return pd.DataFrame({'time': times, name: rng.normal(size=n)})
+
+def _merge_asof_chain(streams, target):
+    master = streams[target]
+    for name, stream in streams.items():
+        if name != target:
+            master = pd.merge_asof(master, stream, on='time', direction='nearest')
+    return master
+
+@pytest.mark.parametrize('seed', range(20))
+def test_nearest_matches_chained_merge_asof(seed):
+    rng = np.random.default_rng(seed)
+    streams = {
+        'rpm': _stream(rng, 'rpm', 300, 0.01),
+        'steer': _stream(rng, 'steer', 120, 0.02),
+        'gyro': _stream(rng, 'yaw_rate', 80, 0.05),
+    }
+    expected = _merge_asof_chain(streams, 'rpm')
+    got = align_streams(streams, target='rpm')
+    pd.testing.assert_frame_equal(got[expected.columns], expected, check_dtype=False)
+
+def test_target_stream_keeps_duplicate_timestamps():
+    rpm = pd.DataFrame({'time': [0, .01, .01, .02], 'rpm': [1, 2, 3, 4]})
+    assert align_streams({'rpm': rpm})['rpm'].tolist() == [1, 2, 3, 4]
+
+def test_tie_goes_to_earlier_sample():
+    streams = {
+        'rpm': pd.DataFrame({'time': [0.0, 0.5, 1.0], 'rpm': [1, 2, 3]}),
+        'steer': pd.DataFrame({'time': [0.25, 0.75], 'steer': [10.0, 20.0]}),
+    }
+    # 0.5 is equally far from both steer samples
+    assert align_streams(streams)['steer'].tolist() == [10.0, 10.0, 20.0]
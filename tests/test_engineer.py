@@ -0,0 +1,135 @@
+"""
+The engineer's tool layer, driven by a scripted stand-in for the LLM on a
+small synthetic session (no network, no LangChain needed).
+"""
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from synthetic import write_session
+from stitcher import load_and_stitch_from_folder
+from engineer import RaceEngineer, TelemetrySession, TOOLS, MAX_TOOL_ROUNDS
+from track import corner_slice
+
+class StandInLLM:
+    """Replays a script: each step is either a list of (tool, args) calls or a final answer."""
+
+    def __init__(self, script, final="out of rounds"):
+        self.script = list(script)
+        self.final = final
+        self.schemas = None
+        self.calls = []
+        self.issued = 0
+
+    def bind_tools(self, schemas):
+        self.schemas = schemas
+        return self
+
+    def invoke(self, messages):
+        self.calls.append(list(messages))
+        if self.script:
+            step = self.script.pop(0)
+        elif self.schemas is not None and len(self.calls) <= MAX_TOOL_ROUNDS:
+            step = [('fastest_lap', {})]
+        else:
+            return SimpleNamespace(content=self.final, tool_calls=[])
+        if isinstance(step, str):
+            return SimpleNamespace(content=step, tool_calls=[])
+        calls = []
+        for name, args in step:
+            calls.append({'name': name, 'args': args, 'id': f"call{self.issued}"})
+            self.issued += 1
+        return SimpleNamespace(content="", tool_calls=calls)
+
+@pytest.fixture(scope="module", params=['single', 'batch'])
+def master_df(request, tmp_path_factory):
+    folder = str(tmp_path_factory.mktemp(request.param))
+    write_session(folder, request.param, 400, 20)
+    df, status_msg = load_and_stitch_from_folder(folder)
+    assert df is not None, status_msg
+    return df
+
+def _tool_results(messages):
+    return {m['tool_call_id']: json.loads(m['content'])
+            for m in messages if isinstance(m, dict) and m.get('role') == 'tool'}
+
+def test_tool_loop_answers_after_tool_calls(master_df):
+    llm = StandInLLM([
+        [('fastest_lap', {}), ('lap_times', {})],
+        [('corner_stat', {'corner': 1, 'channel': 'rpm', 'stat': 'min'})],
+        "Lap 3 was quickest.",
+    ])
+    engineer = RaceEngineer(master_df, "setup", llm=llm)
+
+    assert engineer.ask("Which lap was fastest?") == "Lap 3 was quickest."
+    assert [s['function']['name'] for s in llm.schemas] == list(TOOLS)
+    assert len(llm.calls) == 3
+
+    # The last request carries every tool result so far
+    results = _tool_results(llm.calls[-1])
+    assert sorted(results) == ['call0', 'call1', 'call2']
+    complete = [r for r in results['call1'] if r['complete']]
+    assert results['call0']['lap_time'] == pytest.approx(min(r['lap_time'] for r in complete))
+    assert all(set(r) == {'lap', 'min'} for r in results['call2'])
+
+def test_tool_loop_is_bounded(master_df):
+    llm = StandInLLM([], final="best guess")
+    engineer = RaceEngineer(master_df, "setup", llm=llm)
+
+    assert engineer.ask("Keep going") == "best guess"
+    assert len(llm.calls) == MAX_TOOL_ROUNDS + 1
+
+def test_run_tool_reports_errors(master_df):
+    engineer = RaceEngineer(master_df, "setup", llm=StandInLLM([]))
+
+    assert 'error' in engineer.run_tool('no_such_tool', {})
+    assert 'error' in engineer.run_tool('corner_stat', {'corner': 1})  # missing arguments
+    assert 'error' in engineer.run_tool('corner_stat', {'corner': 99, 'channel': 'rpm', 'stat': 'min'})
+    assert 'error' in engineer.run_tool('corner_stat', {'corner': 1, 'channel': 'nope', 'stat': 'min'})
+    assert 'error' in engineer.run_tool('speed_trace', {'lap': 999})
+    assert 'error' in engineer.run_tool('lap_delta', {'lap': 999})
+
+@pytest.mark.parametrize("stat, reduce", [('min', np.nanmin), ('max', np.nanmax), ('mean', np.mean)])
+def test_corner_stat_matches_corner_slices(master_df, stat, reduce):
+    engineer = RaceEngineer(master_df, "setup", llm=StandInLLM([]))
+    index = engineer.session.corners
+    assert not index.empty
+
+    for corner in index['corner'].unique():
+        result = engineer.run_tool('corner_stat', {'corner': int(corner), 'channel': 'rpm', 'stat': stat})
+        assert result, f"corner {corner}"
+        for row in result:
+            rows = corner_slice(master_df, index, corner, row['lap'])
+            assert len(rows) > 0
+            assert row[stat] == pytest.approx(float(reduce(rows['rpm'].to_numpy(dtype='float64'))))
+
+def test_corner_index_covers_complete_laps_only(master_df):
+    session = TelemetrySession(master_df)
+    complete = set(session.summary.loc[session.summary['complete'], 'lap'])
+    assert set(session.corners['lap']) == complete
+
+def test_engineers_share_one_session(master_df):
+    session = TelemetrySession(master_df)
+    first = RaceEngineer(master_df, "setup A", llm=StandInLLM([]), session=session)
+    corners = first.session.corners
+    second = RaceEngineer(master_df, "setup B", llm=StandInLLM([]), session=session)
+    assert second.session.corners is corners
+
+def test_distance_tools_report_missing_speed(tmp_path):
+    write_session(str(tmp_path), 'batch', 400, 20)
+    os.remove(os.path.join(tmp_path, '_GPS.csv'))
+    df, status_msg = load_and_stitch_from_folder(str(tmp_path))
+    assert df is not None and 'speed_mph' not in df.columns, status_msg
+
+    engineer = RaceEngineer(df, "setup", llm=StandInLLM([]))
+    for name, args in [('list_corners', {}), ('corner_stat', {'corner': 1, 'channel': 'rpm', 'stat': 'min'}),
+                       ('speed_trace', {'lap': 1}), ('lap_delta', {'lap': 1})]:
+        assert engineer.run_tool(name, args) == {'error': "This session has no speed channel"}, name
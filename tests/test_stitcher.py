@@ -0,0 +1,71 @@
+"""
+Batch stitching: incremental restitch against a full rebuild, and lap
+assignment from beacon markers.
+"""
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from synthetic import write_session
+from cache import SessionCache
+from stitcher import load_and_stitch_from_folder, process_batch_files, assign_laps, lap_slice
+
+@pytest.mark.parametrize('added', ['GyroZ.csv', 'Steering Angle.csv'])
+def test_incremental_restitch_matches_full_rebuild(tmp_path, added):
+    full = tmp_path / 'full'
+    write_session(str(full), 'batch', 400, 20)
+    folder = tmp_path / 'session'
+    folder.mkdir()
+    for name in os.listdir(full):
+        if name != added:
+            shutil.copy(full / name, folder)
+
+    cache = SessionCache(str(tmp_path / 'cache'))
+    load_and_stitch_from_folder(str(folder), cache=cache)
+    shutil.copy(full / added, folder)
+    df, status_msg = load_and_stitch_from_folder(str(folder), cache=cache)
+    assert status_msg == "Success (Batch, Incremental)"
+
+    expected, _ = process_batch_files(str(full))
+    assert list(df.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(df, expected)
+    for key in ('beacon_markers', 'lap_offsets', 'lap_summary', 'sources'):
+        assert df.attrs[key] == expected.attrs[key], key
+
+    # Cached under the full folder's key in the same layout
+    cached, status_msg = load_and_stitch_from_folder(str(folder), cache=cache)
+    assert status_msg == "Success (Cached)"
+    assert list(cached.columns) == list(expected.columns)
+
+def test_assign_laps_splits_at_markers():
+    times = np.array([0.0, 1.0, 2.0, 3.0, 4.0, 5.0])
+    laps, lap_offsets = assign_laps(times, [3.0, 1.5])
+
+    # Markers end a lap; a sample exactly on a marker starts the next one
+    assert laps.tolist() == [1, 1, 2, 3, 3, 3]
+    assert lap_offsets == [[1, 0, 2], [2, 2, 3], [3, 3, 6]]
+
+def test_assign_laps_without_markers_is_one_lap():
+    laps, lap_offsets = assign_laps(np.arange(4.0), [])
+    assert laps.tolist() == [1, 1, 1, 1]
+    assert lap_offsets == [[1, 0, 4]]
+
+def test_lap_slice_uses_offsets_or_lap_column():
+    times = np.linspace(0, 10, 101)
+    laps, lap_offsets = assign_laps(times, [2.5, 6.0])
+    df = pd.DataFrame({'time': times, 'lap': laps})
+    plain = df.copy()
+    df.attrs['lap_offsets'] = lap_offsets
+
+    for lap in (1, 2, 3):
+        pd.testing.assert_frame_equal(lap_slice(df, lap), plain[plain['lap'] == lap])
+    assert lap_slice(df, 4).empty
+    assert lap_slice(df, 0).empty
@@ -0,0 +1,98 @@
+"""
+Start/finish crossings on a synthetic circular track with known crossing
+times, and TrackIndex against exhaustive nearest-point search.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from track import unproject, gate_crossings, detect_laps, TrackIndex
+
+CENTRE = (50.0, 8.0)
+RADIUS = 100.0
+LAP_S = 30.0
+OMEGA = 2 * np.pi / LAP_S
+
+def _circle(theta):
+    return unproject(RADIUS * np.cos(theta), RADIUS * np.sin(theta), CENTRE)
+
+# Radial gate across the circle at angle 0
+GATE = tuple((float(la), float(lo)) for la, lo in zip(*unproject([RADIUS - 10, RADIUS + 10], [0, 0], CENTRE)))
+
+def test_crossing_times_are_interpolated_between_fixes():
+    times = np.arange(0, 100, 0.1)
+    lat, lon = _circle(OMEGA * times - 0.3)
+    expected = 0.3 / OMEGA + LAP_S * np.arange(4)
+    assert gate_crossings(times, lat, lon, GATE) == pytest.approx(expected, abs=1e-3)
+
+def test_crossing_at_the_first_fix_counts_once():
+    times = np.arange(0, 100, 0.1)
+    lat, lon = _circle(OMEGA * times)
+    # Fixes land exactly on the gate at 0, 30, 60 and 90 s
+    assert gate_crossings(times, lat, lon, GATE) == pytest.approx([0.0, 30.0, 60.0, 90.0], abs=1e-6)
+
+def test_crossings_against_the_usual_direction_are_dropped():
+    times = np.arange(0, 115, 0.1)
+    # Four laps forward, then backing up over the line once around 108.6 s
+    theta = np.where(times <= 100, OMEGA * times, OMEGA * (200 - times)) - 0.3
+    lat, lon = _circle(theta)
+    expected = 0.3 / OMEGA + LAP_S * np.arange(4)
+    assert gate_crossings(times, lat, lon, GATE) == pytest.approx(expected, abs=1e-3)
+
+def test_crossings_closer_than_min_lap_are_jitter():
+    times = np.arange(0, 40, 0.1)
+    # Wobbling back and forth across the line for two seconds after the start
+    theta = OMEGA * times - 0.1 + 0.2 * np.sin(2 * np.pi * times) * (times < 2)
+    lat, lon = _circle(theta)
+    assert len(gate_crossings(times, lat, lon, GATE, min_lap_s=0.0)) > 2
+    crossings = gate_crossings(times, lat, lon, GATE, min_lap_s=5.0)
+    assert len(crossings) == 2
+    assert crossings[0] < 1
+    assert crossings[1] == pytest.approx(0.1 / OMEGA + LAP_S, abs=1e-3)
+
+def test_detect_laps_places_the_gate_at_top_speed():
+    times = np.arange(0, 100, 0.1)
+    theta = OMEGA * times - 0.3
+    lat, lon = _circle(theta)
+    speed = 20 + 5 * np.cos(theta)  # fastest at angle 0, where GATE is
+
+    crossings, gate = detect_laps(times, lat, lon, speed)
+    assert gate is not None
+    assert crossings == pytest.approx(0.3 / OMEGA + LAP_S * np.arange(4), abs=0.05)
+    assert detect_laps(times, lat, lon) == ([], None)
+
+def _exhaustive(px, py, qx, qy):
+    d2 = (px[None, :] - qx[:, None]) ** 2 + (py[None, :] - qy[:, None]) ** 2
+    return np.sqrt(d2.min(axis=1))
+
+@pytest.mark.parametrize('seed', range(5))
+def test_track_index_matches_exhaustive_search(seed):
+    rng = np.random.default_rng(seed)
+    theta = np.linspace(0, 2 * np.pi, 800, endpoint=False)
+    px = RADIUS * np.cos(theta) + rng.normal(0, 0.5, len(theta))
+    py = 0.6 * RADIUS * np.sin(theta) + rng.normal(0, 0.5, len(theta))
+    index = TrackIndex(px, py)
+
+    # Near the line (grid path) and far off it (brute-force fallback)
+    near = rng.integers(0, len(px), 2000)
+    qx = np.concatenate([px[near] + rng.normal(0, 2, len(near)), rng.uniform(-300, 300, 500)])
+    qy = np.concatenate([py[near] + rng.normal(0, 2, len(near)), rng.uniform(-300, 300, 500)])
+
+    nearest, dist = index.query(qx, qy)
+    expected = _exhaustive(px, py, qx, qy)
+    np.testing.assert_allclose(dist, expected, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(np.hypot(px[nearest] - qx, py[nearest] - qy), expected, rtol=0, atol=1e-9)
+
+def test_track_index_skips_nan_points_and_queries():
+    px = np.array([0.0, np.nan, 10.0, 20.0])
+    py = np.array([0.0, 5.0, 0.0, 0.0])
+    nearest, dist = TrackIndex(px, py).query([9.0, np.nan, 100.0], [1.0, 0.0, 0.0])
+    assert nearest.tolist() == [2, -1, 3]
+    assert dist[0] == pytest.approx(np.hypot(1, 1))
+    assert np.isnan(dist[1])
+    assert dist[2] == pytest.approx(80.0)